@@ -0,0 +1,130 @@
+# async_equity.py
+#
+# This file answers equity queries from asyncio code without blocking the
+# event loop. Simulations run in a pool of worker processes, and queries are
+# combined before they get there:
+#
+#   - queries are keyed by their suit-isomorphic class (card_isomorphism),
+#     so concurrent queries for the same spot, or for spots that only differ
+#     by a relabelling of the suits, share a single simulation, and
+#   - new queries wait for a short window and are then sent to a worker
+#     together, where holdem_batch_simulation plays them in one vectorized
+#     run.
+#
+# Passing a ThreadPoolExecutor as the executor runs the batches on threads
+# of this process instead, which avoids pickling for low-latency use.
+#
+#     async with Async_equity_service() as service:
+#         win_pct = await service.equity([(14, 'Spade'), (13, 'Spade')], 3)
+
+
+import asyncio
+import functools
+from concurrent.futures import ProcessPoolExecutor
+
+import tuning_profile
+from card_isomorphism import canonical_cards, id_card
+from holdem_batch_simulation import play_holdem_games
+
+
+class Async_equity_service():
+    """ Coalesce and batch equity queries and simulate them in worker processes. """
+
+    def __init__(self, executor=None, max_workers=None, game_simulations=1000, batch_window_ms=2,
+                 max_batch_sims=200000, seed=0):
+        """ Use the given executor, or start a process pool with the tuned number of workers. """
+
+        if executor is None:
+            if max_workers is None:
+                max_workers = tuning_profile.get_setting('max_workers')
+            executor = ProcessPoolExecutor(max_workers=max_workers)
+            self.owns_executor = True
+        else:
+            self.owns_executor = False
+
+        self.executor = executor
+        self.game_simulations = game_simulations
+        self.batch_window = batch_window_ms / 1000
+        self.max_batch_sims = max_batch_sims
+        self.seed = seed
+
+        # Futures of queries being simulated or waiting to be, by query key.
+        self.in_flight = {}
+        self.pending = []
+        self.pending_sims = 0
+        self.flush_handle = None
+        self.counts = {'queries': 0, 'coalesced': 0, 'batches': 0}
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
+
+    async def equity(self, players_hand, num_of_other_players, board=None, game_sims=None):
+        """ Get the win percentage of a hand against random hands, like play_game. """
+
+        game_sims = game_sims or self.game_simulations
+        hand_ids, board_ids = canonical_cards(players_hand, board or [])
+        key = (hand_ids, board_ids, num_of_other_players, game_sims)
+        self.counts['queries'] += 1
+
+        future = self.in_flight.get(key)
+        if future is None:
+            loop = asyncio.get_running_loop()
+            future = self.in_flight[key] = loop.create_future()
+            self.pending.append(key)
+            self.pending_sims += game_sims
+
+            if self.pending_sims >= self.max_batch_sims:
+                self.flush()
+            elif self.flush_handle is None:
+                self.flush_handle = loop.call_later(self.batch_window, self.flush)
+        else:
+            self.counts['coalesced'] += 1
+
+        # Shielded so one caller giving up doesn't cancel the result for the others.
+        return await asyncio.shield(future)
+
+    def flush(self):
+        """ Send the queries waiting in the current window to a worker as one batch. """
+
+        if self.flush_handle is not None:
+            self.flush_handle.cancel()
+            self.flush_handle = None
+        if not self.pending:
+            return
+
+        keys, self.pending, self.pending_sims = self.pending, [], 0
+        queries = [([id_card(c) for c in hand_ids], num_of_other_players, game_sims, [id_card(c) for c in board_ids])
+                   for hand_ids, board_ids, num_of_other_players, game_sims in keys]
+
+        batch = asyncio.get_running_loop().run_in_executor(self.executor, play_holdem_games, queries,
+                                                           self.seed + self.counts['batches'])
+        batch.add_done_callback(functools.partial(self.resolve, keys))
+        self.counts['batches'] += 1
+
+    def resolve(self, keys, batch):
+        """ Hand a finished batch's results to the futures of its queries. """
+
+        for i, key in enumerate(keys):
+            future = self.in_flight.pop(key)
+            if future.done():
+                continue
+
+            if batch.cancelled():
+                future.cancel()
+            elif batch.exception() is not None:
+                future.set_exception(batch.exception())
+            else:
+                future.set_result(batch.result()[i])
+
+    async def close(self):
+        """ Finish the queries already asked for and shut down the process pool if we started it. """
+
+        self.flush()
+        await asyncio.gather(*self.in_flight.values(), return_exceptions=True)
+
+        # Wait for the pool's processes to exit in a thread, not on the event loop.
+        if self.owns_executor:
+            await asyncio.get_running_loop().run_in_executor(None, self.executor.shutdown)
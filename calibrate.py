@@ -0,0 +1,272 @@
+# calibrate.py
+#
+# This file picks the engine's tuning settings for the machine it runs on.
+# The best batch sizes, worker count and exact-versus-sampled switchover
+# depend on the core count, cache sizes and the mix of queries, so each one
+# is measured with short probes of simulation workloads:
+#
+#   - batch_hands: how many player hands the batch evaluator scores at once
+#     when replaying showdowns (the cache-sized batch of hand_history_replay),
+#   - holdem_batch_deals: how many hold'em games are simulated in one batch,
+#   - omaha_batch_deals: how many Omaha deals are scored in one batch,
+#   - exact_runout_limit: the number of runouts up to which enumerating them
+#     all costs no more than dealing a sample of them,
+#   - max_workers: how many worker processes give the most games per second,
+#     and
+#   - threads: how many threads give the most games per second when one
+#     query is split over a thread pool.
+#
+# The chosen settings are saved to the tuning profile, which the simulator
+# reads the first time it needs one of them:
+#     python calibrate.py --duration 0.5
+
+
+import argparse
+import math
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+import hand_history_replay
+import holdem_batch_simulation
+import omaha_simulation
+import tuning_profile
+from hand_evaluator import board_masks_batch, evaluate_with_board_batch
+from poker_monte_carlo import simulate_cell
+
+
+BATCH_HANDS_CANDIDATES = [2 ** i for i in range(12, 19)]
+HOLDEM_BATCH_DEALS_CANDIDATES = [2 ** i for i in range(10, 17)]
+OMAHA_BATCH_DEALS_CANDIDATES = [2 ** i for i in range(9, 15)]
+
+# Players at the table in the batch probes.
+PROBE_PLAYERS = 6
+
+# Showdowns replayed by the exact-versus-sampled probe.
+PROBE_REPLAY_HANDS = 64
+
+# Games played by each job of the worker probe.
+PROBE_GAME_SIMS = 200
+
+# Games of the single query split over threads by the thread probe.
+PROBE_THREADED_SIMS = 100000
+
+# A larger worker or thread count has to be at least this much faster to be picked.
+WORKER_GAIN = 1.05
+
+
+def time_throughput(run, units, duration):
+    """ Call run() repeatedly for about duration seconds and return the units processed per second. """
+
+    # One untimed call to warm up caches and lazily built tables.
+    run()
+
+    calls = 0
+    start = time.perf_counter()
+    while True:
+        run()
+        calls += 1
+        elapsed = time.perf_counter() - start
+        if elapsed >= duration:
+            return calls * units / elapsed
+
+
+def random_deals(rng, num_deals, num_players, hole_size):
+    """ Deal hole cards for every player and a full board, as card numbers, without repeats in a deal. """
+
+    num_cards = num_players * hole_size + 5
+    cards = np.argsort(rng.random((num_deals, 52)), axis=1)[:, :num_cards]
+
+    return cards[:, :-5].reshape(num_deals, num_players, hole_size), cards[:, -5:]
+
+
+def random_records(rng, num_hands, num_players, allin_street):
+    """ Make hand history records of random all-in showdowns with equal stacks. """
+
+    hole, board = random_deals(rng, num_hands, num_players, 2)
+
+    records = np.zeros(num_hands, dtype=hand_history_replay.RECORD_DTYPE)
+    records['hand_id'] = np.arange(num_hands)
+    records['num_players'] = num_players
+    records['allin_street'] = allin_street
+    records['hole'] = hand_history_replay.NO_CARD
+    records['hole'][:, :num_players] = hole
+    records['board'] = board
+    records['contributions'][:, :num_players] = 100
+
+    return records
+
+
+def probe_batch_hands(duration, rng):
+    """ Measure player hands scored per second for each batch size of the showdown evaluator. """
+
+    throughput = {}
+    for batch_hands in BATCH_HANDS_CANDIDATES:
+        hole, boards = random_deals(rng, batch_hands // PROBE_PLAYERS, PROBE_PLAYERS, 2)
+
+        def run():
+            board_masks = tuple(mask[:, None] for mask in board_masks_batch(boards))
+            evaluate_with_board_batch(board_masks, hole)
+
+        throughput[batch_hands] = time_throughput(run, hole.shape[0] * PROBE_PLAYERS, duration)
+
+    return throughput
+
+
+def probe_holdem_batch_deals(duration, rng):
+    """ Measure hold'em games simulated per second for each batch size. """
+
+    hands = np.array([[48, 49]])
+    boards = np.zeros((1, 0), dtype=np.int64)
+
+    throughput = {}
+    for batch_deals in HOLDEM_BATCH_DEALS_CANDIDATES:
+        run = lambda: holdem_batch_simulation.simulate_holdem_batch(hands, boards, [PROBE_PLAYERS - 1],
+                                                                    [batch_deals], rng, batch_deals)
+        throughput[batch_deals] = time_throughput(run, batch_deals, duration)
+
+    return throughput
+
+
+def probe_omaha_batch_deals(duration, rng):
+    """ Measure Omaha deals scored per second for each batch size. """
+
+    throughput = {}
+    for batch_deals in OMAHA_BATCH_DEALS_CANDIDATES:
+        hole, boards = random_deals(rng, batch_deals, PROBE_PLAYERS, 4)
+        throughput[batch_deals] = time_throughput(lambda: omaha_simulation.omaha_strengths(hole, boards),
+                                                  batch_deals, duration)
+
+    return throughput
+
+
+def probe_runout_costs(duration, rng):
+    """ Measure the cost per runout of enumerating every flop runout and of sampling runouts.
+
+    Returns runouts evaluated per second for each method.
+    """
+
+    records = random_records(rng, PROBE_REPLAY_HANDS, 2, 3)
+    exact_runouts = PROBE_REPLAY_HANDS * math.comb(52 - 2 * 2 - 3, 2)
+    sampled_runouts = PROBE_REPLAY_HANDS * hand_history_replay.SAMPLED_RUNOUTS
+
+    return {
+        'exact': time_throughput(lambda: hand_history_replay.replay_records(records, exact_limit=10 ** 9),
+                                 exact_runouts, duration),
+        'sampled': time_throughput(lambda: hand_history_replay.replay_records(records, exact_limit=0),
+                                   sampled_runouts, duration),
+    }
+
+
+def worker_candidates():
+    """ Get the worker or thread counts to try: powers of two up to the number of cores, and that number. """
+
+    cpu_count = os.cpu_count() or 1
+    return sorted({1, cpu_count} | {2 ** i for i in range(cpu_count.bit_length()) if 2 ** i < cpu_count})
+
+
+def probe_workers(duration):
+    """ Measure games simulated per second for each number of worker processes. """
+
+    hand = [(14, 'Spade'), (13, 'Heart')]
+
+    throughput = {}
+    for workers in worker_candidates():
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            def run():
+                futures = [executor.submit(simulate_cell, hand, 3, PROBE_GAME_SIMS, 0, seed)
+                           for seed in range(workers * 2)]
+                for future in futures:
+                    future.result()
+
+            throughput[workers] = time_throughput(run, workers * 2 * PROBE_GAME_SIMS, duration)
+
+    return throughput
+
+
+def probe_threads(duration, rng):
+    """ Measure games simulated per second for one query split over each number of threads. """
+
+    hands = np.array([[48, 49]])
+    boards = np.zeros((1, 0), dtype=np.int64)
+
+    throughput = {}
+    for threads in worker_candidates():
+        run = lambda: holdem_batch_simulation.simulate_holdem_threaded(hands, boards, [PROBE_PLAYERS - 1],
+                                                                       [PROBE_THREADED_SIMS], rng.integers(1 << 32),
+                                                                       threads)
+        throughput[threads] = time_throughput(run, PROBE_THREADED_SIMS, duration)
+
+    return throughput
+
+
+def pick_workers(throughput):
+    """ Pick the fewest workers whose throughput no larger count beats by WORKER_GAIN. """
+
+    best = min(throughput)
+    for workers in sorted(throughput):
+        if throughput[workers] > throughput[best] * WORKER_GAIN:
+            best = workers
+    return best
+
+
+def calibrate(duration=0.5, seed=0):
+    """ Run every probe and return (settings, measurements). """
+
+    rng = np.random.default_rng(seed)
+
+    batch_hands = probe_batch_hands(duration, rng)
+    holdem_batch_deals = probe_holdem_batch_deals(duration, rng)
+    omaha_batch_deals = probe_omaha_batch_deals(duration, rng)
+    runout_costs = probe_runout_costs(duration, rng)
+    workers = probe_workers(duration)
+    threads = probe_threads(duration, rng)
+
+    # Enumerating n runouts costs no more than sampling while n is below this.
+    exact_limit = int(hand_history_replay.SAMPLED_RUNOUTS * runout_costs['exact'] / runout_costs['sampled'])
+
+    settings = {
+        'batch_hands': max(batch_hands, key=batch_hands.get),
+        'holdem_batch_deals': max(holdem_batch_deals, key=holdem_batch_deals.get),
+        'omaha_batch_deals': max(omaha_batch_deals, key=omaha_batch_deals.get),
+        'exact_runout_limit': max(exact_limit, hand_history_replay.SAMPLED_RUNOUTS),
+        'max_workers': pick_workers(workers),
+        'threads': pick_workers(threads),
+    }
+    measurements = {
+        'hands_per_second': batch_hands,
+        'holdem_games_per_second': holdem_batch_deals,
+        'omaha_deals_per_second': omaha_batch_deals,
+        'runouts_per_second': runout_costs,
+        'games_per_second': workers,
+        'threaded_games_per_second': threads,
+    }
+
+    return settings, measurements
+
+
+def main():
+    """ Calibrate this machine from the command line and save its tuning profile. """
+
+    parser = argparse.ArgumentParser(description='Pick batch sizes and worker counts for this machine.')
+    parser.add_argument('--duration', type=float, default=0.5, help='Seconds to time each probe setting for.')
+    parser.add_argument('--output', default=tuning_profile.PROFILE_FILE)
+    parser.add_argument('--dry-run', action='store_true', help="Print the settings but don't save them.")
+    args = parser.parse_args()
+
+    settings, measurements = calibrate(args.duration)
+
+    for name, throughput in measurements.items():
+        print(f"{name}: " + ', '.join(f"{key}={value:,.0f}" for key, value in throughput.items()))
+    for name, value in settings.items():
+        print(f"{name} = {value}")
+
+    if not args.dry_run:
+        tuning_profile.save_profile(settings, measurements, args.output)
+        print(f"Saved the tuning profile to {args.output}")
+
+
+if __name__ == '__main__':
+    main()
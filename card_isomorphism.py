@@ -0,0 +1,143 @@
+# card_isomorphism.py
+#
+# This file maps concrete cards onto suit-isomorphic classes. Two sets of
+# cards that only differ by a relabelling of the suits (for example Ah Kh on
+# a 2h 7c 9d flop and As Ks on a 2s 7d 9h flop) have the same equity, so
+# tables only need to store one entry per class. Cards are the
+# (value, suit) tuples used by Poker_monte_carlo; internally they are
+# numbered 0-51 as (value - 2) * 4 + suit index.
+
+
+import itertools
+
+import numpy as np
+
+
+SUITS = ['Spade', 'Heart', 'Diamond', 'Club']
+SUIT_INDEX = {suit: i for i, suit in enumerate(SUITS)}
+RANK_CHARS = '23456789TJQKA'
+
+# Every relabelling of the four suits.
+SUIT_PERMUTATIONS = list(itertools.permutations(range(4)))
+
+# There are 169 starting hand classes: 13 pairs, 78 suited and 78 offsuit hands.
+NUM_HAND_CLASSES = 169
+
+
+def card_id(card):
+    """ Number a (value, suit) card from 0 to 51. """
+
+    return (card[0] - 2) * 4 + SUIT_INDEX[card[1]]
+
+
+def id_card(card_number):
+    """ Turn a card number back into a (value, suit) card. """
+
+    return (int(card_number) // 4 + 2, SUITS[int(card_number) % 4])
+
+
+def hand_class_index(hand):
+    """ Index a pair of hole cards into the 13x13 starting hand grid.
+
+    Pairs lie on the diagonal, suited hands above it and offsuit hands
+    below it, with aces in the first row and column.
+    """
+
+    high, low = sorted([hand[0][0] - 2, hand[1][0] - 2], reverse=True)
+
+    if hand[0][1] == hand[1][1] and high != low:
+        return (12 - high) * 13 + (12 - low)
+    return (12 - low) * 13 + (12 - high)
+
+
+def hand_class_name(index):
+    """ Name a starting hand class, e.g. 'AKs', 'AKo' or 'TT'. """
+
+    row, column = divmod(index, 13)
+    first, second = RANK_CHARS[12 - row], RANK_CHARS[12 - column]
+
+    if row == column:
+        return first + second
+    if row < column:
+        return first + second + 's'
+    return second + first + 'o'
+
+
+def hand_class_representative(index):
+    """ Get the canonical card numbers (sorted) of a starting hand class.
+
+    The representative uses the lowest suits possible, which is also the
+    form canonical_key gives the hand.
+    """
+
+    row, column = divmod(index, 13)
+    first, second = 12 - row, 12 - column
+
+    if row == column:
+        return (first * 4, first * 4 + 1)
+    if row < column:
+        return (second * 4, first * 4)
+    return (first * 4, second * 4 + 1)
+
+
+def canonical_cards(hand, board):
+    """ Relabel suits so hole cards and board take their smallest numbering.
+
+    The hole cards are made as small as possible first and the board is
+    then minimised among the relabellings that keep the hole cards fixed.
+    Returns the sorted card numbers of both.
+    """
+
+    hand_ids = [card_id(card) for card in hand]
+    board_ids = [card_id(card) for card in board]
+
+    best = None
+    for permutation in SUIT_PERMUTATIONS:
+        mapped_hand = tuple(sorted((c // 4) * 4 + permutation[c % 4] for c in hand_ids))
+        mapped_board = tuple(sorted((c // 4) * 4 + permutation[c % 4] for c in board_ids))
+
+        if best is None or (mapped_hand, mapped_board) < best:
+            best = (mapped_hand, mapped_board)
+
+    return best
+
+
+def encode_key(hand_ids, board_ids):
+    """ Pack sorted hole card and board numbers into one integer. """
+
+    key = 0
+    for c in tuple(hand_ids) + tuple(board_ids):
+        key = key * 52 + c
+    return key
+
+
+def canonical_key(hand, board):
+    """ Integer key of the suit-isomorphic class of hole cards and a board. """
+
+    return encode_key(*canonical_cards(hand, board))
+
+
+def canonical_flop_keys(index):
+    """ Get the sorted keys of every flop class for one starting hand class.
+
+    Flops are only merged by relabellings that leave the hole cards in
+    place, so suit interactions between the hand and the flop (flush
+    draws, blockers) are kept apart.
+    """
+
+    hand_ids = hand_class_representative(index)
+    remaining = np.array([c for c in range(52) if c not in hand_ids])
+    flops = np.array(list(itertools.combinations(remaining, 3)))
+
+    flop_keys = []
+    for permutation in SUIT_PERMUTATIONS:
+        mapped_hand = tuple(sorted((c // 4) * 4 + permutation[c % 4] for c in hand_ids))
+        if mapped_hand != hand_ids:
+            continue
+
+        mapped = (flops // 4) * 4 + np.array(permutation)[flops % 4]
+        mapped.sort(axis=1)
+        flop_keys.append(mapped[:, 0] * 52 ** 2 + mapped[:, 1] * 52 + mapped[:, 2])
+
+    hand_key = hand_ids[0] * 52 + hand_ids[1]
+    return hand_key * 52 ** 3 + np.unique(np.min(flop_keys, axis=0))
@@ -52,6 +52,7 @@ def process_csv(input_file, output_file):
     print(f"Processed data has been written to {output_file}")
 
 # Run the script
-input_file = 'data/pocket_hand_wins.csv'
-output_file = 'data/fixed_pocket_hand_wins.csv'
-process_csv(input_file, output_file)
\ No newline at end of file
+if __name__ == '__main__':
+    input_file = 'data/pocket_hand_wins.csv'
+    output_file = 'data/fixed_pocket_hand_wins.csv'
+    process_csv(input_file, output_file)
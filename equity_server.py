@@ -0,0 +1,510 @@
+# equity_server.py
+#
+# This file runs a small local equity server for services written in other
+# languages, using only the standard library (and the simulator itself).
+# It listens on a TCP port or a Unix socket and speaks HTTP/1.1 with
+# keep-alive, so a client can send many requests over one connection.
+#
+#   POST /equity   {"queries": [{"hand": ["Ah", "Kd"], "opponents": 3,
+#                                "board": ["2h", "7c", "9d"]}, ...],
+#                   "time_budget_ms": 20}
+#       Answers a batch of queries. Each one is looked up in the preflop and
+#       flop tables (held in memory), then in a cache of earlier simulation
+#       results, and the rest are simulated together in one vectorized run
+#       sized to fit the time budget. Queries are keyed by suit-isomorphic
+#       class, so relabelled suits share table rows, cache entries and
+#       simulations.
+#
+#   GET /stats
+#       Query counts by source, the cache size and latency histograms of
+#       /equity, /stats (any other paths share one) and the simulation runs.
+#
+# The load-test command sends batches of random queries from several
+# keep-alive connections and reports throughput and latency percentiles:
+#     python equity_server.py serve --port 8765
+#     python equity_server.py load-test --port 8765 --connections 8
+
+
+import argparse
+import bisect
+import http.client
+import json
+import math
+import os
+import random
+import socket
+import socketserver
+import threading
+import time
+from collections import OrderedDict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import poker_hand_lookup
+from card_isomorphism import canonical_cards, id_card
+from holdem_batch_simulation import play_holdem_games
+from poker_monte_carlo import Poker_monte_carlo, win_confidence_interval
+
+
+CARD_VALUES = {char: value for value, char in poker_hand_lookup.rank_map.items()}
+CARD_SUITS = {char: suit for suit, char in poker_hand_lookup.suit_map.items()}
+
+# Upper bounds of the latency histogram buckets, in milliseconds.
+LATENCY_BUCKETS_MS = [0.1, 0.25, 0.5, 1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000, 2500]
+
+# Simulation throughput assumed until the first run has been timed.
+INITIAL_GAMES_PER_SECOND = 200000
+
+MAX_OPPONENTS = 9
+
+# Request paths with their own latency histogram; every other path shares one.
+ROUTES = ('/equity', '/stats')
+OTHER_ROUTE = 'other'
+
+
+def parse_card(text):
+    """ Turn a card like 'Ah' or 'Td' into a (value, suit) card. """
+
+    if (not isinstance(text, str) or len(text) != 2 or text[0].upper() not in CARD_VALUES
+            or text[1].lower() not in CARD_SUITS):
+        raise ValueError(f'Not a card: {text!r}')
+    return CARD_VALUES[text[0].upper()], CARD_SUITS[text[1].lower()]
+
+
+def parse_query(query):
+    """ Turn a JSON query into (hand, number of opponents, board), checking it makes sense. """
+
+    hand, board, num_of_other_players = query['hand'], query.get('board', []), query['opponents']
+
+    if not isinstance(hand, list) or len(hand) != 2:
+        raise ValueError('hand must be a list of two cards, like ["Ah", "Kd"].')
+    if not isinstance(board, list) or len(board) not in (0, 3, 4, 5):
+        raise ValueError('board must be a list of 0, 3, 4 or 5 cards.')
+
+    # bool is a subclass of int, but true isn't a number of opponents.
+    if not isinstance(num_of_other_players, int) or isinstance(num_of_other_players, bool):
+        raise ValueError('opponents must be an integer.')
+
+    hand = [parse_card(card) for card in hand]
+    board = [parse_card(card) for card in board]
+
+    if len(set(hand + board)) != len(hand) + len(board):
+        raise ValueError('A card appears more than once.')
+    if not 1 <= num_of_other_players <= MAX_OPPONENTS:
+        raise ValueError(f'opponents must be from 1 to {MAX_OPPONENTS}.')
+
+    return hand, num_of_other_players, board
+
+
+class Latency_histogram():
+    """ Count latencies into fixed buckets, safe to share between threads. """
+
+    def __init__(self):
+        """ Start with empty buckets. """
+
+        self.counts = [0] * (len(LATENCY_BUCKETS_MS) + 1)
+        self.total_ms = 0.0
+        self.lock = threading.Lock()
+
+    def record(self, seconds):
+        """ Count one latency. """
+
+        milliseconds = seconds * 1000
+        with self.lock:
+            self.counts[bisect.bisect_left(LATENCY_BUCKETS_MS, milliseconds)] += 1
+            self.total_ms += milliseconds
+
+    def percentile(self, counts, fraction):
+        """ Get the upper bound of the bucket holding a fraction of the counted latencies. """
+
+        target = fraction * sum(counts)
+        seen = 0
+        for bucket, count in enumerate(counts):
+            seen += count
+            if count and seen >= target:
+                return LATENCY_BUCKETS_MS[bucket] if bucket < len(LATENCY_BUCKETS_MS) else float('inf')
+        return None
+
+    def snapshot(self):
+        """ Get the counts, mean and approximate percentiles. """
+
+        with self.lock:
+            counts = list(self.counts)
+            total_ms = self.total_ms
+
+        labels = [f'<={bound}ms' for bound in LATENCY_BUCKETS_MS] + [f'>{LATENCY_BUCKETS_MS[-1]}ms']
+        return {
+            'count': sum(counts),
+            'mean_ms': total_ms / sum(counts) if sum(counts) else None,
+            'p50_ms': self.percentile(counts, 0.5),
+            'p90_ms': self.percentile(counts, 0.9),
+            'p99_ms': self.percentile(counts, 0.99),
+            'buckets': dict(zip(labels, counts)),
+        }
+
+
+class Equity_service():
+    """ Answer batches of equity queries from the tables, a cache or a bounded-time simulation. """
+
+    def __init__(self, time_budget_ms=20, cache_size=100000, min_game_sims=200, max_game_sims=20000):
+        """ Set the default time budget, the cache size and the games simulated per query.
+
+        Each query gets at most max_game_sims games, and fewer when the
+        batch would not fit in the time budget. Results of fewer than
+        min_game_sims games are returned but not cached, so later requests
+        simulate them again.
+        """
+
+        self.simulation = Poker_monte_carlo()
+        self.time_budget_ms = time_budget_ms
+        self.cache_size = cache_size
+        self.min_game_sims = min_game_sims
+        self.max_game_sims = max_game_sims
+
+        # Simulated results by (canonical hand, canonical board, opponents), least recently used first.
+        self.cache = OrderedDict()
+        self.lock = threading.Lock()
+        self.games_per_second = INITIAL_GAMES_PER_SECOND
+        self.simulation_runs = 0
+        self.counts = {'queries': 0, 'table': 0, 'cache': 0, 'simulation': 0}
+        self.simulation_latency = Latency_histogram()
+
+    def cached(self, key):
+        """ Get a cached result, marking it as recently used, or None. """
+
+        with self.lock:
+            result = self.cache.get(key)
+            if result is not None:
+                self.cache.move_to_end(key)
+            return result
+
+    def store(self, key, result):
+        """ Cache a result, dropping the least recently used ones beyond the cache size. """
+
+        with self.lock:
+            self.cache[key] = result
+            self.cache.move_to_end(key)
+            while len(self.cache) > self.cache_size:
+                self.cache.popitem(last=False)
+
+    def simulate(self, keys, time_budget_ms):
+        """ Simulate queries together, splitting the time budget between them. Returns their results. """
+
+        # Size the run from the measured throughput, so the whole batch fits in the budget.
+        game_sims = int(self.games_per_second * time_budget_ms / 1000 / len(keys))
+        game_sims = max(1, min(self.max_game_sims, game_sims))
+
+        with self.lock:
+            seed = self.simulation_runs
+            self.simulation_runs += 1
+
+        queries = [([id_card(c) for c in hand_ids], num_of_other_players, game_sims, [id_card(c) for c in board_ids])
+                   for hand_ids, board_ids, num_of_other_players in keys]
+
+        start = time.perf_counter()
+        win_percentages = play_holdem_games(queries, seed)
+        elapsed = time.perf_counter() - start
+        self.simulation_latency.record(elapsed)
+
+        # Follow changes in throughput (e.g. from load) without jumping on one run.
+        self.games_per_second = 0.8 * self.games_per_second + 0.2 * (game_sims * len(keys) / elapsed)
+
+        results = []
+        for win_percentage in win_percentages:
+            ci_low, ci_high = win_confidence_interval(round(win_percentage * game_sims / 100), game_sims)
+            results.append({'win_pct': win_percentage, 'simulations': game_sims,
+                            'ci_low': ci_low, 'ci_high': ci_high, 'source': 'simulation'})
+        return results
+
+    def answer(self, queries, time_budget_ms=None):
+        """ Answer a list of parsed (hand, opponents, board) queries, in order. """
+
+        start = time.perf_counter()
+        time_budget_ms = time_budget_ms or self.time_budget_ms
+        results = [None] * len(queries)
+        misses = OrderedDict()
+        counts = {'table': 0, 'cache': 0, 'simulation': 0}
+
+        for i, (hand, num_of_other_players, board) in enumerate(queries):
+            # Relabelled suits look up the same table rows through their canonical cards.
+            key = canonical_cards(hand, board) + (num_of_other_players,)
+            table_entry = self.simulation.table_equity([id_card(c) for c in key[0]], num_of_other_players,
+                                                       [id_card(c) for c in key[1]])
+            if table_entry is not None:
+                win_percentage, game_sims = table_entry
+                ci_low, ci_high = win_confidence_interval(round(win_percentage * game_sims / 100), game_sims)
+                results[i] = {'win_pct': win_percentage, 'simulations': game_sims,
+                              'ci_low': ci_low, 'ci_high': ci_high, 'source': 'table'}
+                counts['table'] += 1
+                continue
+
+            result = self.cached(key)
+            if result is not None:
+                results[i] = dict(result, source='cache')
+                counts['cache'] += 1
+            else:
+                misses.setdefault(key, []).append(i)
+                counts['simulation'] += 1
+
+        # The lookups have used up part of the budget already.
+        if misses:
+            remaining_ms = max(0.0, time_budget_ms - (time.perf_counter() - start) * 1000)
+            for key, result in zip(misses, self.simulate(list(misses), remaining_ms)):
+                if result['simulations'] >= self.min_game_sims:
+                    self.store(key, result)
+                for i in misses[key]:
+                    results[i] = result
+
+        with self.lock:
+            self.counts['queries'] += len(queries)
+            for source, count in counts.items():
+                self.counts[source] += count
+
+        return results
+
+    def stats(self):
+        """ Get the query counts, cache size and simulation latencies. """
+
+        with self.lock:
+            return {'counts': dict(self.counts), 'cache_size': len(self.cache),
+                    'games_per_second': self.games_per_second,
+                    'simulation_latency': self.simulation_latency.snapshot()}
+
+
+class Equity_request_handler(BaseHTTPRequestHandler):
+    """ Serve /equity and /stats over HTTP/1.1 with keep-alive. """
+
+    protocol_version = 'HTTP/1.1'
+
+    def send_json(self, status, payload):
+        """ Send a JSON response, keeping the connection open. """
+
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def timed(self, handle):
+        """ Run a request handler and record its latency under the request path. """
+
+        start = time.perf_counter()
+        handle()
+        self.server.latency(self.path).record(time.perf_counter() - start)
+
+    def do_POST(self):
+        """ Answer a batch of equity queries. """
+
+        self.timed(self.post_equity)
+
+    def do_GET(self):
+        """ Report the server's statistics. """
+
+        self.timed(self.get_stats)
+
+    def post_equity(self):
+        """ Parse and answer a POST /equity request. """
+
+        body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        if self.path != '/equity':
+            self.send_json(404, {'error': f'Unknown path {self.path}'})
+            return
+
+        try:
+            request = json.loads(body)
+            if not isinstance(request['queries'], list):
+                raise ValueError('queries must be a list.')
+            queries = [parse_query(query) for query in request['queries']]
+            time_budget_ms = request.get('time_budget_ms')
+            if time_budget_ms is not None:
+                time_budget_ms = float(time_budget_ms)
+                if not 0 < time_budget_ms < math.inf:
+                    raise ValueError('time_budget_ms must be a positive number of milliseconds.')
+        except (ValueError, KeyError, TypeError) as error:
+            self.send_json(400, {'error': str(error)})
+            return
+
+        # Report failures to the client rather than dropping the connection.
+        try:
+            results = self.server.service.answer(queries, time_budget_ms)
+        except Exception as error:
+            self.send_json(500, {'error': f'{type(error).__name__}: {error}'})
+            return
+
+        self.send_json(200, {'results': results})
+
+    def get_stats(self):
+        """ Answer a GET /stats request. """
+
+        if self.path != '/stats':
+            self.send_json(404, {'error': f'Unknown path {self.path}'})
+            return
+
+        self.send_json(200, dict(self.server.service.stats(), uptime_s=time.time() - self.server.started,
+                                 latency=self.server.latency_snapshots()))
+
+    def log_message(self, format, *args):
+        """ Keep quiet; request latencies are reported at /stats instead. """
+
+
+class Equity_server_mixin():
+    """ State shared by the TCP and Unix socket servers. """
+
+    daemon_threads = True
+
+    def setup_service(self, service):
+        """ Attach the equity service and start the latency histograms. """
+
+        self.service = service
+        self.started = time.time()
+        self.histograms = {route: Latency_histogram() for route in ROUTES + (OTHER_ROUTE,)}
+
+    def latency(self, path):
+        """ Get the latency histogram of a request path, shared by all unknown paths. """
+
+        return self.histograms.get(path, self.histograms[OTHER_ROUTE])
+
+    def latency_snapshots(self):
+        """ Get the latency statistics of every route. """
+
+        return {route: histogram.snapshot() for route, histogram in self.histograms.items()}
+
+
+class Equity_http_server(Equity_server_mixin, ThreadingHTTPServer):
+    """ Serve equity requests on a TCP port, one thread per connection. """
+
+    def __init__(self, address, service):
+        super().__init__(address, Equity_request_handler)
+        self.setup_service(service)
+
+
+class Equity_unix_server(Equity_server_mixin, socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    """ Serve equity requests on a Unix socket, one thread per connection. """
+
+    def __init__(self, path, service):
+        super().__init__(path, Equity_request_handler)
+        self.setup_service(service)
+
+
+class Unix_http_connection(http.client.HTTPConnection):
+    """ An HTTP connection over a Unix socket. """
+
+    def __init__(self, path, timeout=30):
+        super().__init__('localhost', timeout=timeout)
+        self.unix_path = path
+
+    def connect(self):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.settimeout(self.timeout)
+        self.sock.connect(self.unix_path)
+
+
+def random_query(rng, flop_share=0.3):
+    """ Make a random query, preflop or (some of the time) on the flop. """
+
+    deck = [rank + suit for rank in CARD_VALUES for suit in CARD_SUITS]
+    cards = rng.sample(deck, 5)
+    board = cards[2:] if rng.random() < flop_share else []
+
+    return {'hand': cards[:2], 'opponents': rng.randint(1, 8), 'board': board}
+
+
+def load_test(host='127.0.0.1', port=8765, unix_socket=None, connections=4, requests_per_connection=250,
+              batch_size=8, time_budget_ms=None, seed=0):
+    """ Send batches of random queries over keep-alive connections and report latencies. """
+
+    latencies = []
+    errors = []
+    lock = threading.Lock()
+
+    def client(index):
+        rng = random.Random(seed + index)
+        connection = Unix_http_connection(unix_socket) if unix_socket else http.client.HTTPConnection(host, port)
+        own_latencies = []
+
+        try:
+            for _ in range(requests_per_connection):
+                body = json.dumps({'queries': [random_query(rng) for _ in range(batch_size)],
+                                   'time_budget_ms': time_budget_ms})
+
+                start = time.perf_counter()
+                connection.request('POST', '/equity', body, {'Content-Type': 'application/json'})
+                response = connection.getresponse()
+                response.read()
+                own_latencies.append(time.perf_counter() - start)
+
+                if response.status != 200:
+                    raise RuntimeError(f'HTTP {response.status}')
+        except Exception as error:
+            with lock:
+                errors.append(repr(error))
+        finally:
+            connection.close()
+
+        with lock:
+            latencies.extend(own_latencies)
+
+    start = time.perf_counter()
+    threads = [threading.Thread(target=client, args=(i,)) for i in range(connections)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+
+    latencies.sort()
+    percentile = lambda fraction: latencies[min(len(latencies) - 1, int(fraction * len(latencies)))] * 1000
+
+    return {
+        'requests': len(latencies),
+        'queries': len(latencies) * batch_size,
+        'errors': errors,
+        'seconds': elapsed,
+        'requests_per_second': len(latencies) / elapsed,
+        'queries_per_second': len(latencies) * batch_size / elapsed,
+        'p50_ms': percentile(0.5) if latencies else None,
+        'p90_ms': percentile(0.9) if latencies else None,
+        'p99_ms': percentile(0.99) if latencies else None,
+    }
+
+
+def main():
+    """ Run the server or the load test from the command line. """
+
+    parser = argparse.ArgumentParser(description='Local equity lookup and simulation server.')
+    parser.add_argument('command', choices=['serve', 'load-test'])
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--unix-socket', default=None, help='Listen on (or connect to) this socket path instead.')
+    parser.add_argument('--time-budget-ms', type=float, default=20)
+    parser.add_argument('--cache-size', type=int, default=100000)
+    parser.add_argument('--connections', type=int, default=4)
+    parser.add_argument('--requests', type=int, default=250, help='Requests per connection in the load test.')
+    parser.add_argument('--batch-size', type=int, default=8, help='Queries per request in the load test.')
+    args = parser.parse_args()
+
+    if args.command == 'load-test':
+        print(json.dumps(load_test(args.host, args.port, args.unix_socket, args.connections, args.requests,
+                                   args.batch_size, args.time_budget_ms), indent=2))
+        return
+
+    service = Equity_service(args.time_budget_ms, args.cache_size)
+    if args.unix_socket:
+        server = Equity_unix_server(args.unix_socket, service)
+        print(f"Serving on {args.unix_socket}")
+    else:
+        server = Equity_http_server((args.host, args.port), service)
+        print(f"Serving on http://{args.host}:{args.port}")
+
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        if args.unix_socket:
+            os.unlink(args.unix_socket)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,209 @@
+# flop_equity_table.py
+#
+# This file builds and reads a precomputed table of on-flop win percentages.
+# For every suit-isomorphic class of hole cards and flop (1,286,792 classes
+# spread over the 169 starting hands) the Monte Carlo simulation is run once
+# against 1 to 8 random opponents, offline. The results are stored as a .npy
+# array that is memory-mapped when read, so an on-flop query becomes a table
+# read instead of a fresh simulation.
+#
+# Run this file to build (or resume building) the table:
+#     python flop_equity_table.py --sims 1000 --workers 8
+
+
+import argparse
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+
+import card_isomorphism
+import tuning_profile
+
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data')
+TABLE_FILE = 'flop_equity_table.npy'
+KEYS_FILE = 'flop_equity_keys.npy'
+INFO_FILE = 'flop_equity_table.json'
+
+MAX_OPPONENTS = 8
+
+# Tables that have been opened, keyed by directory.
+loaded_tables = {}
+
+
+class Flop_equity_table():
+    """ Memory-mapped win percentages indexed by (hand class, flop class, opponents). """
+
+    def __init__(self, keys, table, game_simulations):
+        """ Wrap the sorted class keys and the matching rows of win percentages. """
+
+        self.keys = keys
+        self.table = table
+        self.game_simulations = game_simulations
+
+        # Rows of each hand class are contiguous since keys start with the hole cards.
+        class_keys = [encode_hand_prefix(i) for i in range(card_isomorphism.NUM_HAND_CLASSES)]
+        self.class_offsets = np.searchsorted(keys, class_keys)
+
+    def row(self, hand, flop):
+        """ Find the table row of some hole cards and a flop, or None if they aren't a valid class.
+
+        Cards shared between the hand and the flop, or repeated in the flop,
+        give keys that aren't in the table.
+        """
+
+        key = card_isomorphism.canonical_key(hand, flop)
+        row = int(np.searchsorted(self.keys, key))
+
+        if row == len(self.keys) or self.keys[row] != key:
+            return None
+        return row
+
+    def cell(self, hand, flop):
+        """ Get the (hand class, flop class) of some hole cards and a flop, or None if they aren't valid. """
+
+        row = self.row(hand, flop)
+        if row is None:
+            return None
+
+        hand_class = card_isomorphism.hand_class_index(hand)
+        return hand_class, row - int(self.class_offsets[hand_class])
+
+    def lookup(self, hand, flop, num_of_other_players):
+        """ Get the win percentage of a hand on a flop, or None if it isn't built yet or isn't valid. """
+
+        if not 1 <= num_of_other_players <= MAX_OPPONENTS:
+            return None
+
+        row = self.row(hand, flop)
+        if row is None:
+            return None
+
+        win_percentage = self.table[row, num_of_other_players - 1]
+        if np.isnan(win_percentage):
+            return None
+        return float(win_percentage)
+
+
+def encode_hand_prefix(hand_class):
+    """ Smallest key of a starting hand class. """
+
+    return card_isomorphism.encode_key(card_isomorphism.hand_class_representative(hand_class), (0, 0, 0))
+
+
+def decode_key(key):
+    """ Turn a class key back into concrete hole cards and a flop. """
+
+    card_numbers = []
+    for i in range(5):
+        key, card_number = divmod(int(key), 52)
+        card_numbers.insert(0, card_number)
+
+    cards = [card_isomorphism.id_card(c) for c in card_numbers]
+    return cards[:2], cards[2:]
+
+
+def build_keys():
+    """ Get the sorted keys of every hole card and flop class. """
+
+    keys = [card_isomorphism.canonical_flop_keys(i) for i in range(card_isomorphism.NUM_HAND_CLASSES)]
+    return np.sort(np.concatenate(keys))
+
+
+def load_table(directory=DATA_DIR):
+    """ Open the table in a directory read-only, or return None if it hasn't been built. """
+
+    if directory not in loaded_tables:
+        table_path = os.path.join(directory, TABLE_FILE)
+        if not os.path.exists(table_path):
+            return None
+
+        with open(os.path.join(directory, INFO_FILE), 'r') as file:
+            info = json.load(file)
+
+        loaded_tables[directory] = Flop_equity_table(np.load(os.path.join(directory, KEYS_FILE), mmap_mode='r'),
+                                                     np.load(table_path, mmap_mode='r'),
+                                                     info['game_simulations'])
+
+    return loaded_tables[directory]
+
+
+def simulate_rows(row_keys, game_simulations, seed):
+    """ Simulate the win percentages of a chunk of table rows in a worker process. """
+
+    from poker_monte_carlo import Poker_monte_carlo
+
+    simulation = Poker_monte_carlo()
+    np.random.seed(seed)
+
+    results = np.empty((len(row_keys), MAX_OPPONENTS), dtype=np.float32)
+    for i, key in enumerate(row_keys):
+        hand, flop = decode_key(key)
+        for num_of_other_players in range(1, MAX_OPPONENTS + 1):
+            results[i, num_of_other_players - 1] = simulation.play_game(hand, num_of_other_players,
+                                                                        game_simulations, 0, flop)
+
+    return results
+
+
+def build_table(directory=DATA_DIR, game_simulations=1000, max_workers=None, chunk_size=256):
+    """ Build the table, resuming from any rows already stored in the directory. """
+
+    if max_workers is None:
+        max_workers = tuning_profile.get_setting('max_workers')
+
+    os.makedirs(directory, exist_ok=True)
+    keys_path = os.path.join(directory, KEYS_FILE)
+    table_path = os.path.join(directory, TABLE_FILE)
+    info_path = os.path.join(directory, INFO_FILE)
+
+    if os.path.exists(table_path):
+        with open(info_path, 'r') as file:
+            if json.load(file)['game_simulations'] != game_simulations:
+                raise ValueError('The existing table was built with a different number of simulations.')
+
+        keys = np.load(keys_path)
+        table = np.load(table_path, mmap_mode='r+')
+    else:
+        keys = build_keys()
+        np.save(keys_path, keys)
+        table = np.lib.format.open_memmap(table_path, mode='w+', dtype=np.float32,
+                                          shape=(len(keys), MAX_OPPONENTS))
+        table[:] = np.nan
+        with open(info_path, 'w') as file:
+            json.dump({'game_simulations': game_simulations, 'max_opponents': MAX_OPPONENTS}, file)
+
+    # Only simulate the rows that haven't been filled in yet.
+    missing_rows = np.flatnonzero(np.isnan(table[:, 0]))
+    chunks = [missing_rows[i:i + chunk_size] for i in range(0, len(missing_rows), chunk_size)]
+
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        futures = {executor.submit(simulate_rows, keys[rows], game_simulations, int(rows[0])): rows
+                   for rows in chunks}
+
+        for done, future in enumerate(as_completed(futures), 1):
+            table[futures[future]] = future.result()
+
+            if done % 100 == 0 or done == len(chunks):
+                table.flush()
+                print(f"Built {done}/{len(chunks)} chunks")
+
+    loaded_tables.pop(directory, None)
+
+
+def main():
+    """ Build the flop equity table from the command line. """
+
+    parser = argparse.ArgumentParser(description='Build the flop equity table.')
+    parser.add_argument('--directory', default=DATA_DIR)
+    parser.add_argument('--sims', type=int, default=1000)
+    parser.add_argument('--workers', type=int, default=None)
+    args = parser.parse_args()
+
+    build_table(args.directory, args.sims, args.workers)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,72 @@
+# folding_model.py
+#
+# This file models opponents folding before the flop. Each of the 1,326
+# possible pairs of hole cards gets a preflop strength, taken from a column
+# of the pocket hand table (by default the heads-up win percentage) and
+# averaged over its starting hand class (AKo, 77, ...) so that every
+# relabelling of the suits folds or continues together, and
+# an opponent only continues to the showdown when their hole cards are at
+# least as strong as a threshold. The threshold can also come from a range:
+# continuing with the strongest 25% of hands, say.
+#
+# Strengths are kept in one array indexed through HAND_INDEX, so whole
+# batches of dealt hands are sorted into folds and calls with a couple of
+# array lookups. Cards are numbered 0-51 as in card_isomorphism.
+
+
+import functools
+import itertools
+
+import numpy as np
+
+import poker_hand_lookup
+from card_isomorphism import card_id, hand_class_index, id_card
+
+
+NUM_HOLE_CARD_PAIRS = 1326
+
+# Index (0-1325) of every pair of distinct cards, in either order.
+HAND_INDEX = np.full((52, 52), -1, dtype=np.int64)
+for index, (first, second) in enumerate(itertools.combinations(range(52), 2)):
+    HAND_INDEX[first, second] = HAND_INDEX[second, first] = index
+
+CARD_IDS = {poker_hand_lookup.rank_map[value] + poker_hand_lookup.suit_map[suit]: card_id((value, suit))
+            for value in poker_hand_lookup.rank_map for suit in poker_hand_lookup.suit_map}
+
+
+@functools.lru_cache(maxsize=None)
+def preflop_strengths(column='win_pct1'):
+    """ Get the strength of each of the 1,326 hole card pairs from a column of the pocket hand table.
+
+    Each pair gets the mean of the column over its starting hand class.
+    """
+
+    strengths = np.full(NUM_HOLE_CARD_PAIRS, np.nan)
+    for pocket_cards, row in poker_hand_lookup.load_hand_data().items():
+        first, second = (CARD_IDS[card] for card in pocket_cards.split('_'))
+        strengths[HAND_INDEX[first, second]] = float(row[column])
+
+    if np.isnan(strengths).any():
+        raise ValueError('The pocket hand table is missing some hole card pairs.')
+
+    # Average the table's noisy per-pair results over each of the 169 classes.
+    classes = np.array([hand_class_index((id_card(first), id_card(second)))
+                        for first, second in itertools.combinations(range(52), 2)])
+    class_strengths = np.bincount(classes, weights=strengths, minlength=169) / np.bincount(classes, minlength=169)
+    return class_strengths[classes]
+
+
+def range_threshold(top_fraction, column='win_pct1'):
+    """ Get the strength threshold that keeps the strongest top_fraction of hole card pairs. """
+
+    strengths = np.sort(preflop_strengths(column))[::-1]
+    num_continuing = min(NUM_HOLE_CARD_PAIRS, max(1, int(np.ceil(top_fraction * NUM_HOLE_CARD_PAIRS))))
+
+    return strengths[num_continuing - 1]
+
+
+def continuing(hole_cards, threshold, column='win_pct1'):
+    """ Get which hands, an array of shape (..., 2) of card numbers, are strong enough to continue. """
+
+    hole_cards = np.asarray(hole_cards)
+    return preflop_strengths(column)[HAND_INDEX[hole_cards[..., 0], hole_cards[..., 1]]] >= threshold
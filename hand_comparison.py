@@ -0,0 +1,118 @@
+# hand_comparison.py
+#
+# This file decides whether one holding is stronger than another against a
+# number of random opponents, with as few simulated games as possible.
+# Both hands are played on common deals: the same opponents' hole cards and
+# the same board, so only the deals won by exactly one of the two hands
+# carry information about which is stronger. On those deals the share won
+# by the first hand is tested with two sequential probability ratio tests
+# (SPRT), one for "the first hand is stronger" and one for "the second hand
+# is stronger", each against the hypothesis that the hands are even.
+#
+# Games are simulated in small batches and the tests are checked after each
+# one, so clear differences are settled after a few thousand games. When
+# both tests accept that the hands are even, or the budget of games runs
+# out first, the hands are reported as indistinguishable.
+#
+# Cards are the (value, suit) tuples used by Poker_monte_carlo; like
+# play_game, ties with the opponents count as wins.
+
+
+import math
+
+import numpy as np
+
+from card_isomorphism import card_id
+from hand_evaluator import board_masks_batch, evaluate_with_board_batch
+from holdem_batch_simulation import deal_holdem
+
+
+# Games simulated between checks of the tests.
+BATCH_GAMES = 500
+
+
+def sprt_decision(log_likelihood_ratio, alpha, beta):
+    """ Get an SPRT's decision: 1 to accept the alternative, -1 to accept the null, 0 to go on. """
+
+    if log_likelihood_ratio >= math.log((1 - beta) / alpha):
+        return 1
+    if log_likelihood_ratio <= math.log(beta / (1 - alpha)):
+        return -1
+    return 0
+
+
+def compare_hands(first_hand, second_hand, num_of_other_players, board=None, edge=0.05, alpha=0.01, beta=0.01,
+                  max_game_sims=200000, batch_games=BATCH_GAMES, seed=None):
+    """ Test whether one of two hands is stronger against num_of_other_players random hands.
+
+    edge is the smallest difference worth detecting, as how far the share
+    of deals won by only the first hand must be from one half. alpha and
+    beta are the error rates of each test. Returns a dict with the result
+    ('first', 'second' or 'indistinguishable'), whether it was settled by
+    the tests rather than by running out of games, the games played and
+    each hand's win percentage over them.
+    """
+
+    board = list(board or [])
+    first_ids = [card_id(card) for card in first_hand]
+    second_ids = [card_id(card) for card in second_hand]
+    board_ids = [card_id(card) for card in board]
+
+    if set(first_ids) & set(second_ids + board_ids) or set(second_ids) & set(board_ids):
+        raise ValueError('The two hands and the board must not share any cards.')
+
+    rng = np.random.default_rng(seed)
+    hands = np.broadcast_to(np.array(first_ids), (batch_games, 2))
+    boards = np.broadcast_to(np.array(board_ids, dtype=np.int64), (batch_games, len(board_ids)))
+    dead_cards = np.broadcast_to(np.array(second_ids), (batch_games, 2))
+
+    # Log likelihood ratio of each deal won only by the first or only by the second hand.
+    stronger = math.log((0.5 + edge) / 0.5)
+    weaker = math.log((0.5 - edge) / 0.5)
+
+    game_sims = first_wins = second_wins = first_only = second_only = 0
+    first_decision = second_decision = 0
+
+    while game_sims < max_game_sims:
+        num_games = min(batch_games, max_game_sims - game_sims)
+        hole_cards, full_boards = deal_holdem(hands[:num_games], boards[:num_games], num_of_other_players, rng,
+                                              dead_cards[:num_games])
+        board_masks = board_masks_batch(full_boards)
+
+        # Both hands face the same opponents on the same board.
+        strengths = evaluate_with_board_batch(tuple(mask[:, None] for mask in board_masks), hole_cards)
+        second_strengths = evaluate_with_board_batch(board_masks, dead_cards[:num_games])
+        best_other = strengths[:, 1:].max(axis=1)
+
+        first_won = strengths[:, 0] >= best_other
+        second_won = second_strengths >= best_other
+
+        game_sims += num_games
+        first_wins += int(first_won.sum())
+        second_wins += int(second_won.sum())
+        first_only += int((first_won & ~second_won).sum())
+        second_only += int((second_won & ~first_won).sum())
+
+        # Each test keeps its decision once made.
+        if first_decision == 0:
+            first_decision = sprt_decision(first_only * stronger + second_only * weaker, alpha, beta)
+        if second_decision == 0:
+            second_decision = sprt_decision(second_only * stronger + first_only * weaker, alpha, beta)
+
+        if first_decision == 1 or second_decision == 1 or first_decision == second_decision == -1:
+            break
+
+    if first_decision == 1:
+        result = 'first'
+    elif second_decision == 1:
+        result = 'second'
+    else:
+        result = 'indistinguishable'
+
+    return {
+        'result': result,
+        'settled': result != 'indistinguishable' or first_decision == second_decision == -1,
+        'game_sims': game_sims,
+        'first_win_pct': first_wins / game_sims * 100,
+        'second_win_pct': second_wins / game_sims * 100,
+    }
@@ -0,0 +1,316 @@
+# hand_evaluator.py
+#
+# This file scores poker hands by keeping track of the community cards once
+# per deal. A Board_state counts the ranks and suits on the board and keeps
+# rank bit masks (one bit per card value) for the whole board and for each
+# suit. Each player's hole cards are then applied to it as a small delta
+# instead of counting the board again for every player, and streets can be
+# added to it one card at a time as they are dealt.
+#
+# A hand's strength is a single integer: the hand category (the same 1-9
+# values as Poker_monte_carlo.check_hand) in the high bits, followed by the
+# ranks that break ties, so a stronger hand always has a larger strength.
+#
+# evaluate_batch gives the same strengths for whole arrays of hands at once,
+# with cards numbered 0-51 as in card_isomorphism.
+
+
+import numpy as np
+
+from card_isomorphism import SUIT_INDEX
+
+
+# Names of the hand categories, as returned by Poker_monte_carlo.hand_type.
+HAND_TYPE_NAMES = {9: 'straight flush', 8: 'four of a kind', 7: 'full house', 6: 'flush', 5: 'straight',
+                   4: 'three of a kind', 3: 'two pairs', 2: 'pair', 1: 'high cards'}
+
+CATEGORY_SHIFT = 20
+
+
+def straight_top(rank_mask):
+    """ Get the top rank of the highest straight in a rank mask, or -1. """
+
+    for top in range(12, 3, -1):
+        straight = 0b11111 << (top - 4)
+        if rank_mask & straight == straight:
+            return top
+
+    # Ace-to-five straight.
+    if rank_mask & 0b1000000001111 == 0b1000000001111:
+        return 3
+
+    return -1
+
+
+def top_ranks(rank_mask):
+    """ Pack the five highest ranks of a rank mask into 4 bits each, highest first. """
+
+    packed = 0
+    count = 0
+    for rank in range(12, -1, -1):
+        if rank_mask >> rank & 1:
+            packed |= rank << (4 * (4 - count))
+            count += 1
+            if count == 5:
+                break
+
+    return packed
+
+
+# Every rank mask's straight and top ranks, so they are looked up rather than searched for.
+STRAIGHT_TOP = [straight_top(mask) for mask in range(1 << 13)]
+TOP_RANKS = [top_ranks(mask) for mask in range(1 << 13)]
+
+# The same tables as arrays for evaluate_batch, plus each mask's highest rank.
+STRAIGHT_TOP_ARRAY = np.array(STRAIGHT_TOP, dtype=np.int32)
+TOP_RANKS_ARRAY = np.array(TOP_RANKS, dtype=np.int32)
+HIGHEST_RANK_ARRAY = np.array([max(mask.bit_length() - 1, 0) for mask in range(1 << 13)], dtype=np.int32)
+# Rank bit of each card number, and the same bit moved into its suit's 13 bit field.
+CARD_RANK_BITS = np.array([1 << (card >> 2) for card in range(52)], dtype=np.int32)
+CARD_SUIT_BITS = np.array([1 << ((card >> 2) + 13 * (card & 3)) for card in range(52)], dtype=np.int64)
+RANK_COUNT_ARRAY = np.array([bin(mask).count('1') for mask in range(1 << 13)], dtype=np.int32)
+
+
+def make_strength(category, leading_ranks, kicker_mask=0, num_kickers=0):
+    """ Build a strength from its category, deciding ranks and kickers. """
+
+    strength = category << CATEGORY_SHIFT
+    for i, rank in enumerate(leading_ranks):
+        strength |= rank << (4 * (4 - i))
+
+    if num_kickers:
+        kickers = TOP_RANKS[kicker_mask] >> (4 * (5 - num_kickers))
+        strength |= kickers << (4 * (5 - len(leading_ranks) - num_kickers))
+
+    return strength
+
+
+def hand_category(strength):
+    """ Get the check_hand category of a strength. """
+
+    return strength >> CATEGORY_SHIFT
+
+
+class Board_state():
+    """ Rank and suit counts of the community cards, shared by every player in a deal. """
+
+    def __init__(self, board=()):
+        """ Count the cards already on the board. """
+
+        self.rank_mask = 0
+        self.pair_mask = 0
+        self.trips_mask = 0
+        self.quads_mask = 0
+        self.suit_counts = [0, 0, 0, 0]
+        self.suit_masks = [0, 0, 0, 0]
+
+        for card in board:
+            self.add_card(card)
+
+    def add_card(self, card):
+        """ Add a newly dealt community card to the board. """
+
+        bit = 1 << (card[0] - 2)
+        suit = SUIT_INDEX[card[1]]
+
+        # Each mask holds the ranks seen at least that many times.
+        if self.trips_mask & bit:
+            self.quads_mask |= bit
+        elif self.pair_mask & bit:
+            self.trips_mask |= bit
+        elif self.rank_mask & bit:
+            self.pair_mask |= bit
+        self.rank_mask |= bit
+
+        self.suit_counts[suit] += 1
+        self.suit_masks[suit] |= bit
+
+    def strength(self, hole_cards):
+        """ Get the strength of the best hand made with the board and some hole cards. """
+
+        rank_mask = self.rank_mask
+        pair_mask = self.pair_mask
+        trips_mask = self.trips_mask
+        quads_mask = self.quads_mask
+        hole_suit_counts = {}
+        hole_suit_masks = {}
+
+        # Apply the hole cards on top of the board's counts.
+        for card in hole_cards:
+            bit = 1 << (card[0] - 2)
+            suit = SUIT_INDEX[card[1]]
+
+            if trips_mask & bit:
+                quads_mask |= bit
+            elif pair_mask & bit:
+                trips_mask |= bit
+            elif rank_mask & bit:
+                pair_mask |= bit
+            rank_mask |= bit
+
+            hole_suit_counts[suit] = hole_suit_counts.get(suit, 0) + 1
+            hole_suit_masks[suit] = hole_suit_masks.get(suit, 0) | bit
+
+        # Only the hole cards' suits can reach five cards.
+        flush_mask = 0
+        for suit, count in hole_suit_counts.items():
+            if self.suit_counts[suit] + count >= 5:
+                flush_mask = self.suit_masks[suit] | hole_suit_masks[suit]
+        if not flush_mask:
+            for suit in range(4):
+                if self.suit_counts[suit] >= 5:
+                    flush_mask = self.suit_masks[suit]
+
+        return score_masks(rank_mask, pair_mask, trips_mask, quads_mask, flush_mask)
+
+
+def score_masks(rank_mask, pair_mask, trips_mask, quads_mask, flush_mask):
+    """ Score a hand from its rank masks and the rank mask of its flush suit. """
+
+    if flush_mask:
+        top = STRAIGHT_TOP[flush_mask]
+        if top >= 0:
+            return make_strength(9, [top])
+
+    if quads_mask:
+        quads = quads_mask.bit_length() - 1
+        return make_strength(8, [quads], rank_mask & ~(1 << quads), 1)
+
+    if trips_mask:
+        trips = trips_mask.bit_length() - 1
+        other_pairs = pair_mask & ~(1 << trips)
+        if other_pairs:
+            return make_strength(7, [trips, other_pairs.bit_length() - 1])
+
+    if flush_mask:
+        return (6 << CATEGORY_SHIFT) | TOP_RANKS[flush_mask]
+
+    top = STRAIGHT_TOP[rank_mask]
+    if top >= 0:
+        return make_strength(5, [top])
+
+    if trips_mask:
+        trips = trips_mask.bit_length() - 1
+        return make_strength(4, [trips], rank_mask & ~(1 << trips), 2)
+
+    if pair_mask:
+        first_pair = pair_mask.bit_length() - 1
+        other_pairs = pair_mask & ~(1 << first_pair)
+
+        if other_pairs:
+            second_pair = other_pairs.bit_length() - 1
+            return make_strength(3, [first_pair, second_pair],
+                                 rank_mask & ~(1 << first_pair) & ~(1 << second_pair), 1)
+
+        return make_strength(2, [first_pair], rank_mask & ~(1 << first_pair), 3)
+
+    return (1 << CATEGORY_SHIFT) | TOP_RANKS[rank_mask]
+
+
+def hand_strength(cards):
+    """ Get the strength of the best hand in a list of cards. """
+
+    return Board_state(cards).strength([])
+
+
+def add_cards_batch(masks, cards):
+    """ Apply arrays of card numbers to arrays of rank masks, like Board_state.add_card.
+
+    masks is a tuple (rank, pair, trips, quads, suits) of arrays, where
+    suits packs the four per-suit rank masks 13 bits apart; cards has shape
+    (..., number of cards) broadcastable against them. Returns new masks.
+    """
+
+    rank_mask, pair_mask, trips_mask, quads_mask, suit_masks = masks
+    # Put the cards axis first so each card's bits are contiguous.
+    cards = np.moveaxis(np.asarray(cards), -1, 0)
+    card_bits = CARD_RANK_BITS[cards]
+    card_suit_bits = CARD_SUIT_BITS[cards]
+
+    for i in range(len(cards)):
+        bit = card_bits[i]
+
+        # Each mask holds the ranks seen at least that many times.
+        quads_mask = quads_mask | (trips_mask & bit)
+        trips_mask = trips_mask | (pair_mask & bit)
+        pair_mask = pair_mask | (rank_mask & bit)
+        rank_mask = rank_mask | bit
+        suit_masks = suit_masks | card_suit_bits[i]
+
+    return rank_mask, pair_mask, trips_mask, quads_mask, suit_masks
+
+
+def board_masks_batch(boards):
+    """ Get the rank masks of an array of boards, with shape (..., number of cards). """
+
+    empty = np.zeros(np.shape(boards)[:-1], dtype=np.int32)
+    masks = (empty, empty, empty, empty, empty.astype(np.int64))
+
+    return add_cards_batch(masks, boards)
+
+
+def score_batch(masks):
+    """ Score arrays of rank masks, like score_masks. """
+
+    rank_mask, pair_mask, trips_mask, quads_mask, suit_masks = masks
+
+    # Rank mask of the suit with five or more cards, if any.
+    flush_mask = np.zeros(rank_mask.shape, dtype=np.int32)
+    for suit in range(4):
+        suit_mask = ((suit_masks >> (13 * suit)) & 0x1FFF).astype(np.int32)
+        flush_mask = np.where(RANK_COUNT_ARRAY[suit_mask] >= 5, suit_mask, flush_mask)
+
+    straight_flush_top = STRAIGHT_TOP_ARRAY[flush_mask]
+    straight_top = STRAIGHT_TOP_ARRAY[rank_mask]
+
+    quads = HIGHEST_RANK_ARRAY[quads_mask]
+    trips = HIGHEST_RANK_ARRAY[trips_mask]
+    first_pair = HIGHEST_RANK_ARRAY[pair_mask]
+    full_house_pairs = pair_mask & ~(1 << trips)
+    other_pairs = pair_mask & ~(1 << first_pair)
+    second_pair = HIGHEST_RANK_ARRAY[other_pairs]
+
+    conditions = [
+        (flush_mask > 0) & (straight_flush_top >= 0),
+        quads_mask > 0,
+        (trips_mask > 0) & (full_house_pairs > 0),
+        flush_mask > 0,
+        straight_top >= 0,
+        trips_mask > 0,
+        other_pairs > 0,
+        pair_mask > 0,
+    ]
+    strengths = [
+        (9 << CATEGORY_SHIFT) | (straight_flush_top << 16),
+        (8 << CATEGORY_SHIFT) | (quads << 16) | ((TOP_RANKS_ARRAY[rank_mask & ~(1 << quads)] >> 16) << 12),
+        (7 << CATEGORY_SHIFT) | (trips << 16) | (HIGHEST_RANK_ARRAY[full_house_pairs] << 12),
+        (6 << CATEGORY_SHIFT) | TOP_RANKS_ARRAY[flush_mask],
+        (5 << CATEGORY_SHIFT) | (straight_top << 16),
+        (4 << CATEGORY_SHIFT) | (trips << 16) | ((TOP_RANKS_ARRAY[rank_mask & ~(1 << trips)] >> 12) << 8),
+        (3 << CATEGORY_SHIFT) | (first_pair << 16) | (second_pair << 12)
+        | ((TOP_RANKS_ARRAY[rank_mask & ~(1 << first_pair) & ~(1 << second_pair)] >> 16) << 8),
+        (2 << CATEGORY_SHIFT) | (first_pair << 16) | ((TOP_RANKS_ARRAY[rank_mask & ~(1 << first_pair)] >> 8) << 4),
+    ]
+
+    return np.select(conditions, strengths, (1 << CATEGORY_SHIFT) | TOP_RANKS_ARRAY[rank_mask])
+
+
+def evaluate_batch(cards):
+    """ Get the strength of the best hand in each row of an array of card numbers.
+
+    cards has shape (..., number of cards) with at least five cards per
+    hand; the result has shape (...) and matches hand_strength.
+    """
+
+    return score_batch(board_masks_batch(cards))
+
+
+def evaluate_with_board_batch(board_masks, hole_cards):
+    """ Get strengths by applying hole cards to rank masks already computed for their boards.
+
+    hole_cards has shape (..., 2) and must broadcast against the board
+    masks, e.g. boards of shape (deals,) with hole cards of shape
+    (deals, players, 2) after adding a players axis to the masks.
+    """
+
+    return score_batch(add_cards_batch(board_masks, hole_cards))
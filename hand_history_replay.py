@@ -0,0 +1,296 @@
+# hand_history_replay.py
+#
+# This file replays logged all-in showdowns to compute each player's all-in
+# equity, expected value and actual result. Hand histories are stored in a
+# compact binary file: an 8 byte header followed by fixed size records (see
+# RECORD_DTYPE) holding the showdown players' hole cards, the board, how
+# many board cards were out when the money went in and what each player put
+# in the pot. Cards are numbered 0-51 as in card_isomorphism, and unused
+# seats are filled with NO_CARD.
+#
+# The file is memory-mapped and processed in chunks spread over worker
+# processes. Within a chunk, hands with the same number of players and
+# all-in street are evaluated together in one batch: every runout is
+# enumerated when there are few enough of them, and otherwise a sample of
+# runouts is dealt. Side pots are settled layer by layer. Results (see
+# RESULT_DTYPE, one row per player) are written straight into a
+# memory-mapped .npy file.
+#
+#     python hand_history_replay.py hands.phh results.npy --workers 8
+
+
+import argparse
+import itertools
+import math
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+import tuning_profile
+from hand_evaluator import board_masks_batch, evaluate_batch, evaluate_with_board_batch
+
+
+MAGIC = b'PHH1\x00\x00\x00\x00'
+HEADER_SIZE = len(MAGIC)
+MAX_PLAYERS = 9
+NO_CARD = 255
+
+RECORD_DTYPE = np.dtype([
+    ('hand_id', '<u8'),
+    ('num_players', 'u1'),
+    ('allin_street', 'u1'),
+    ('hole', 'u1', (MAX_PLAYERS, 2)),
+    ('board', 'u1', (5,)),
+    ('contributions', '<f4', (MAX_PLAYERS,)),
+    ('dead_money', '<f4'),
+])
+
+RESULT_DTYPE = np.dtype([
+    ('hand_id', '<u8'),
+    ('seat', 'u1'),
+    ('equity', '<f4'),
+    ('expected_value', '<f4'),
+    ('net', '<f4'),
+])
+
+# Enumerate every runout when there are at most this many, otherwise sample.
+# The limit and batch size below are defaults, overridden by the machine's
+# tuning profile (see calibrate.py).
+EXACT_RUNOUT_LIMIT = 2000
+SAMPLED_RUNOUTS = 1000
+
+# Player hands evaluated in one batch, to keep the runout arrays cache sized.
+BATCH_HANDS = 65536
+
+
+def write_hand_histories(path, records):
+    """ Write an array of RECORD_DTYPE records to a new hand history file. """
+
+    with open(path, 'wb') as file:
+        file.write(MAGIC)
+        np.asarray(records, dtype=RECORD_DTYPE).tofile(file)
+
+
+def append_hand_histories(path, records):
+    """ Append RECORD_DTYPE records to an existing hand history file. """
+
+    with open(path, 'ab') as file:
+        np.asarray(records, dtype=RECORD_DTYPE).tofile(file)
+
+
+def read_hand_histories(path):
+    """ Memory-map the records of a hand history file. """
+
+    with open(path, 'rb') as file:
+        if file.read(HEADER_SIZE) != MAGIC:
+            raise ValueError(f'{path} is not a hand history file.')
+
+    num_records = (os.path.getsize(path) - HEADER_SIZE) // RECORD_DTYPE.itemsize
+    return np.memmap(path, dtype=RECORD_DTYPE, mode='r', offset=HEADER_SIZE, shape=(num_records,))
+
+
+def remaining_cards(known):
+    """ Get the cards that aren't in any row of known card numbers, in order. """
+
+    in_hand = np.zeros((len(known), 53), dtype=bool)
+    np.put_along_axis(in_hand, np.minimum(known, 52).astype(np.intp), True, axis=1)
+    num_remaining = 52 - known.shape[1]
+
+    return np.argsort(in_hand[:, :52], axis=1, kind='stable')[:, :num_remaining]
+
+
+def sample_without_replacement(rng, shape, population, k):
+    """ Draw k distinct indices below population for every position of shape.
+
+    Draws are repeated only for the rows that came out with a duplicate,
+    which is much cheaper than shuffling the whole population.
+    """
+
+    picks = rng.integers(0, population, size=tuple(shape) + (k,))
+    while True:
+        repeated = np.zeros(shape, dtype=bool)
+        for first, second in itertools.combinations(range(k), 2):
+            repeated |= picks[..., first] == picks[..., second]
+
+        if not repeated.any():
+            return picks
+        picks[repeated] = rng.integers(0, population, size=(int(repeated.sum()), k))
+
+
+def deal_runouts(known_board, unseen, exact_limit, samples, rng):
+    """ Complete each board with every possible runout, or a random sample of them.
+
+    Returns the completed boards with shape (hands, runouts, 5).
+    """
+
+    num_hands, num_unseen = unseen.shape
+    num_missing = 5 - known_board.shape[1]
+
+    if num_missing == 0:
+        return known_board[:, None, :]
+
+    if math.comb(num_unseen, num_missing) <= exact_limit:
+        combinations = np.array(list(itertools.combinations(range(num_unseen), num_missing)))
+        runouts = unseen[:, combinations]
+    else:
+        # Every hand uses the same sampled positions in its own list of unseen
+        # cards, which keeps each hand's runouts uniformly random.
+        picks = sample_without_replacement(rng, (samples,), num_unseen, num_missing)
+        runouts = unseen[:, picks]
+
+    known = np.broadcast_to(known_board[:, None, :], (num_hands, runouts.shape[1], known_board.shape[1]))
+    return np.concatenate([known, runouts], axis=2)
+
+
+def settle_pots(strengths, contributions, dead_money):
+    """ Get the chips each player wins, averaged over runouts, settling side pots in layers.
+
+    strengths has shape (hands, runouts, players) and contributions shape
+    (hands, players).
+    """
+
+    levels = np.sort(contributions, axis=1)
+    previous_level = np.zeros(len(contributions), dtype=contributions.dtype)
+    won = np.zeros(contributions.shape, dtype=np.float64)
+
+    for layer in range(contributions.shape[1]):
+        level = levels[:, layer]
+        eligible = contributions >= level[:, None]
+
+        # Everyone who put in at least this much pays into this layer.
+        layer_amount = (level - previous_level) * eligible.sum(axis=1)
+        if layer == 0:
+            layer_amount = layer_amount + dead_money
+        previous_level = level
+
+        eligible_strengths = np.where(eligible[:, None, :], strengths, -1)
+        winners = eligible_strengths == eligible_strengths.max(axis=2, keepdims=True)
+        share = winners / winners.sum(axis=2, keepdims=True)
+        won += layer_amount[:, None] * share.mean(axis=1)
+
+    return won
+
+
+def replay_group(records, num_players, allin_street, exact_limit, samples, rng):
+    """ Get the equity, expected value and net result of hands sharing a player count and street. """
+
+    hole = records['hole'][:, :num_players].astype(np.int64)
+    board = records['board'].astype(np.int64)
+    contributions = records['contributions'][:, :num_players].astype(np.float64)
+    dead_money = records['dead_money'].astype(np.float64)
+    pot = contributions.sum(axis=1) + dead_money
+
+    # Resolve the showdown that actually happened.
+    actual_cards = np.concatenate([hole, np.broadcast_to(board[:, None, :], (len(records), num_players, 5))], axis=2)
+    actual_won = settle_pots(evaluate_batch(actual_cards)[:, None, :], contributions, dead_money)
+
+    # Deal out the rest of the board from the all-in point.
+    known_board = board[:, :allin_street]
+    unseen = remaining_cards(np.concatenate([hole.reshape(len(records), -1), known_board], axis=1))
+    boards = deal_runouts(known_board, unseen, exact_limit, samples, rng)
+
+    # Count each runout's board once and apply every player's hole cards to it.
+    board_masks = tuple(mask[..., None] for mask in board_masks_batch(boards))
+    strengths = evaluate_with_board_batch(board_masks, hole[:, None, :, :])
+    expected_won = settle_pots(strengths, contributions, dead_money)
+
+    return expected_won / pot[:, None], expected_won - contributions, actual_won - contributions
+
+
+def replay_records(records, exact_limit=None, samples=SAMPLED_RUNOUTS, seed=None):
+    """ Replay an array of records and return one RESULT_DTYPE row per player, in record order.
+
+    exact_limit defaults to the tuned exact runout limit.
+    """
+
+    if exact_limit is None:
+        exact_limit = tuning_profile.get_setting('exact_runout_limit', EXACT_RUNOUT_LIMIT)
+    batch_hands = tuning_profile.get_setting('batch_hands', BATCH_HANDS)
+
+    rng = np.random.default_rng(seed)
+    num_players = records['num_players'].astype(np.int64)
+    first_row = np.concatenate([[0], np.cumsum(num_players)[:-1]])
+
+    results = np.zeros(int(num_players.sum()), dtype=RESULT_DTYPE)
+    results['hand_id'] = np.repeat(records['hand_id'], num_players)
+    results['seat'] = np.arange(len(results)) - np.repeat(first_row, num_players)
+
+    # Batch the hands that need the same amount of work.
+    for players, street in set(zip(num_players.tolist(), records['allin_street'].tolist())):
+        indices = np.flatnonzero((num_players == players) & (records['allin_street'] == street))
+        unseen = 52 - 2 * players - street
+        runouts = math.comb(unseen, 5 - street)
+        runouts = runouts if runouts <= exact_limit else samples
+        batch_size = max(1, batch_hands // (runouts * players))
+
+        for start in range(0, len(indices), batch_size):
+            batch = indices[start:start + batch_size]
+            equity, expected_value, net = replay_group(records[batch], players, street, exact_limit, samples, rng)
+
+            rows = first_row[batch][:, None] + np.arange(players)
+            results['equity'][rows] = equity
+            results['expected_value'][rows] = expected_value
+            results['net'][rows] = net
+
+    return results
+
+
+def replay_chunk(input_path, output_path, start, stop, exact_limit, samples, seed):
+    """ Replay records [start, stop) of a file into their rows of the result file. """
+
+    records = read_hand_histories(input_path)
+    output = np.load(output_path, mmap_mode='r+')
+
+    first_row = int(records['num_players'][:start].sum(dtype=np.int64))
+    results = replay_records(np.array(records[start:stop]), exact_limit, samples, seed)
+    output[first_row:first_row + len(results)] = results
+    output.flush()
+
+    return stop - start
+
+
+def replay_file(input_path, output_path, chunk_size=65536, max_workers=None,
+                exact_limit=None, samples=SAMPLED_RUNOUTS, seed=0):
+    """ Replay every hand in a hand history file across worker processes.
+
+    Results are written to output_path as a .npy array of RESULT_DTYPE rows,
+    one per player, in record order. Returns the number of hands replayed.
+    The worker count and exact runout limit default to the tuned settings.
+    """
+
+    if max_workers is None:
+        max_workers = tuning_profile.get_setting('max_workers')
+    if exact_limit is None:
+        exact_limit = tuning_profile.get_setting('exact_runout_limit', EXACT_RUNOUT_LIMIT)
+
+    records = read_hand_histories(input_path)
+    num_rows = int(records['num_players'].sum(dtype=np.int64))
+    np.lib.format.open_memmap(output_path, mode='w+', dtype=RESULT_DTYPE, shape=(num_rows,)).flush()
+
+    starts = range(0, len(records), chunk_size)
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        futures = [executor.submit(replay_chunk, input_path, output_path, start,
+                                   min(start + chunk_size, len(records)), exact_limit, samples, seed + i)
+                   for i, start in enumerate(starts)]
+
+        return sum(future.result() for future in futures)
+
+
+def main():
+    """ Replay a hand history file from the command line. """
+
+    parser = argparse.ArgumentParser(description='Compute all-in equity and EV for logged showdowns.')
+    parser.add_argument('input_path')
+    parser.add_argument('output_path')
+    parser.add_argument('--chunk-size', type=int, default=65536)
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--exact-limit', type=int, default=None)
+    parser.add_argument('--samples', type=int, default=SAMPLED_RUNOUTS)
+    args = parser.parse_args()
+
+    replay_file(args.input_path, args.output_path, args.chunk_size, args.workers, args.exact_limit, args.samples)
+
+
+if __name__ == '__main__':
+    main()
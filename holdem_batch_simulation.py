@@ -0,0 +1,179 @@
+# holdem_batch_simulation.py
+#
+# This file simulates many hold'em queries together in vectorized batches.
+# A query is a hand, a number of opponents, a number of games and the board
+# cards known so far, like the arguments of Poker_monte_carlo.play_game.
+# Every game of every query becomes one row of a batch: the opponents' hole
+# cards and the rest of the board are dealt from each row's own remaining
+# deck, the board is counted once per row and every player's hole cards are
+# applied to it. Queries with fewer opponents than others in the batch just
+# leave the extra seats empty, so queries sharing a board length can always
+# be simulated together.
+#
+# Opponents can also fold before the flop, following folding_model: with
+# a fold threshold, an opponent whose hole cards are weaker than it drops
+# out of the game, which is one more mask over the seats.
+#
+# A single query can also be spread over a pool of threads in this process
+# (see simulate_holdem_threaded). The deals and evaluation stay inside NumPy
+# operations on large arrays, which release the GIL, so the threads run on
+# separate cores and share their inputs without pickling them, unlike a
+# process pool.
+#
+# Cards are numbered 0-51 as in card_isomorphism; play_holdem_games takes
+# the (value, suit) cards used by Poker_monte_carlo.
+
+
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+import tuning_profile
+from card_isomorphism import card_id
+from folding_model import continuing
+from hand_evaluator import board_masks_batch, evaluate_with_board_batch
+from hand_history_replay import remaining_cards
+
+
+# Games simulated together in one batch, unless the tuning profile says otherwise.
+BATCH_DEALS = 4096
+
+# Thread pools of this process by number of threads, started on first use.
+thread_pools = {}
+
+
+def deal_holdem(hands, boards, num_other_players, rng, dead_cards=None):
+    """ Deal opponents' hole cards and the rest of the board for each row.
+
+    hands has shape (rows, 2) and boards (rows, known board cards). Returns
+    hole cards of shape (rows, num_other_players + 1, 2), with the row's own
+    hand first, and complete boards of shape (rows, 5). Any dead_cards, of
+    shape (rows, number of cards), are kept out of the deal as well.
+    """
+
+    known = [hands, boards] if dead_cards is None else [hands, boards, dead_cards]
+    unseen = remaining_cards(np.concatenate(known, axis=1))
+    num_needed = 2 * num_other_players + 5 - boards.shape[1]
+
+    # A random ordering of each row's remaining deck.
+    order = np.argpartition(rng.random(unseen.shape), num_needed - 1, axis=1)[:, :num_needed]
+    dealt = np.take_along_axis(unseen, order, axis=1)
+
+    other_hands = dealt[:, :2 * num_other_players].reshape(len(hands), num_other_players, 2)
+    hole_cards = np.concatenate([hands[:, None, :], other_hands], axis=1)
+
+    return hole_cards, np.concatenate([boards, dealt[:, 2 * num_other_players:]], axis=1)
+
+
+def simulate_holdem_batch(hands, boards, num_other_players, game_sims, rng, batch_deals=None,
+                          fold_threshold=None):
+    """ Count the wins of a batch of queries that share a board length.
+
+    hands has shape (queries, 2), boards (queries, known board cards) and
+    num_other_players and game_sims shape (queries,). Like play_game, ties
+    count as wins, and so do games where every opponent folds. batch_deals
+    defaults to the tuned batch size; opponents only fold when a
+    fold_threshold (a folding_model preflop strength) is given.
+    """
+
+    hands = np.asarray(hands, dtype=np.int64)
+    boards = np.asarray(boards, dtype=np.int64).reshape(len(hands), -1)
+    num_other_players = np.asarray(num_other_players)
+    max_other_players = int(num_other_players.max())
+    if batch_deals is None:
+        batch_deals = tuning_profile.get_setting('holdem_batch_deals', BATCH_DEALS)
+
+    # Each game of each query is one row.
+    row_queries = np.repeat(np.arange(len(hands)), game_sims)
+    wins = np.zeros(len(hands), dtype=np.int64)
+
+    for start in range(0, len(row_queries), batch_deals):
+        rows = row_queries[start:start + batch_deals]
+        hole_cards, full_boards = deal_holdem(hands[rows], boards[rows], max_other_players, rng)
+
+        board_masks = tuple(mask[:, None] for mask in board_masks_batch(full_boards))
+        strengths = evaluate_with_board_batch(board_masks, hole_cards)
+
+        # Seats beyond a query's number of opponents are left empty.
+        seated = np.arange(1, max_other_players + 1) <= num_other_players[rows][:, None]
+        if fold_threshold is not None:
+            seated &= continuing(hole_cards[:, 1:], fold_threshold)
+        best_other = np.where(seated, strengths[:, 1:], -1).max(axis=1)
+        wins += np.bincount(rows, weights=strengths[:, 0] >= best_other, minlength=len(hands)).astype(np.int64)
+
+    return wins
+
+
+def get_thread_pool(threads):
+    """ Get the shared pool with a number of threads. """
+
+    if threads not in thread_pools:
+        thread_pools[threads] = ThreadPoolExecutor(max_workers=threads, thread_name_prefix='holdem')
+    return thread_pools[threads]
+
+
+def simulate_holdem_threaded(hands, boards, num_other_players, game_sims, seed=None, threads=None,
+                             batch_deals=None, fold_threshold=None):
+    """ Count wins like simulate_holdem_batch, splitting every query's games over threads.
+
+    Each thread gets its own random stream from the seed. threads defaults
+    to the tuned setting, or one per core.
+    """
+
+    if threads is None:
+        threads = tuning_profile.get_setting('threads', os.cpu_count() or 1)
+
+    if not isinstance(seed, np.random.SeedSequence):
+        seed = np.random.SeedSequence(seed)
+
+    game_sims = np.asarray(game_sims)
+    rngs = [np.random.default_rng(thread_seed) for thread_seed in seed.spawn(threads)]
+    shares = [game_sims // threads + (thread < game_sims % threads) for thread in range(threads)]
+
+    if threads == 1:
+        return simulate_holdem_batch(hands, boards, num_other_players, game_sims, rngs[0], batch_deals,
+                                     fold_threshold)
+
+    futures = [get_thread_pool(threads).submit(simulate_holdem_batch, hands, boards, num_other_players,
+                                               share, rng, batch_deals, fold_threshold)
+               for share, rng in zip(shares, rngs) if share.any()]
+    return sum(future.result() for future in futures)
+
+
+def play_holdem_games(queries, seed=None, threads=1, fold_threshold=None):
+    """ Get the win percentage of each query, simulating them all in batches.
+
+    Each query is (players_hand, num_of_other_players, game_sims, board),
+    with board a possibly empty list of cards. With threads other than 1
+    the games are split over a pool of threads (None for the tuned number).
+    With a fold_threshold, opponents weaker than it fold before the flop.
+    """
+
+    seeds = np.random.SeedSequence(seed)
+    results = [None] * len(queries)
+
+    # Queries with the same number of known board cards are dealt together.
+    groups = {}
+    for i, (players_hand, num_of_other_players, game_sims, board) in enumerate(queries):
+        groups.setdefault(len(board), []).append(i)
+
+    for indices in groups.values():
+        group = [queries[i] for i in indices]
+        wins = simulate_holdem_threaded([[card_id(card) for card in query[0]] for query in group],
+                                        [[card_id(card) for card in query[3]] for query in group],
+                                        [query[1] for query in group], [query[2] for query in group],
+                                        seeds.spawn(1)[0], threads, fold_threshold=fold_threshold)
+
+        for i, query, query_wins in zip(indices, group, wins):
+            results[i] = (int(query_wins) / query[2]) * 100
+
+    return results
+
+
+def play_holdem_game(players_hand, num_of_other_players, game_sims, board=None, seed=None, threads=1,
+                     fold_threshold=None):
+    """ Play games of hold'em and get the win percentage of a hand, like Poker_monte_carlo.play_game. """
+
+    return play_holdem_games([(players_hand, num_of_other_players, game_sims, list(board or []))], seed,
+                             threads, fold_threshold)[0]
@@ -0,0 +1,119 @@
+# omaha_simulation.py
+#
+# This file simulates and scores Omaha, where each player has four hole
+# cards and must play exactly two of them with exactly three board cards.
+# That gives 6 x 10 = 60 five card combinations per player, so hands are
+# scored in batches:
+#
+#   - the rank masks of the board's 10 three card subsets are computed once
+#     per deal and shared by every player and hole card pair,
+#   - all 60 combinations are scored on ranks alone (no flushes), and
+#   - flushes are only scored for the few combinations that can make one,
+#     a suited hole card pair with three board cards of the same suit. All
+#     other combinations are skipped since they can't beat their rank-only
+#     score with a flush.
+#
+# Cards are numbered 0-51 as in card_isomorphism; the simulation functions
+# take the (value, suit) cards used by Poker_monte_carlo.
+
+
+import itertools
+
+import numpy as np
+
+import tuning_profile
+from card_isomorphism import card_id
+from hand_evaluator import (CATEGORY_SHIFT, STRAIGHT_TOP_ARRAY, TOP_RANKS_ARRAY, add_cards_batch,
+                            board_masks_batch, score_batch)
+
+
+HOLE_PAIRS = np.array(list(itertools.combinations(range(4), 2)))
+BOARD_TRIPLES = np.array(list(itertools.combinations(range(5), 3)))
+
+# Deals simulated together in one batch, unless the tuning profile says otherwise.
+BATCH_DEALS = 4096
+
+
+def omaha_strengths(hole_cards, boards):
+    """ Get each player's best two hole card + three board card strength.
+
+    hole_cards has shape (deals, players, 4) and boards (deals, 5); the
+    result has shape (deals, players) and is comparable with hand_strength.
+    """
+
+    hole_cards = np.asarray(hole_cards)
+    boards = np.asarray(boards)
+
+    # Rank masks of each board triple, shared by every player: (deals, 1, 1, 10).
+    triples = boards[:, BOARD_TRIPLES]
+    rank_mask, pair_mask, trips_mask, quads_mask, suit_masks = board_masks_batch(triples)
+    triple_masks = tuple(mask[:, None, None, :] for mask in (rank_mask, pair_mask, trips_mask, quads_mask))
+
+    # Hole card pairs of each player: (deals, players, 6, 1, 2).
+    pairs = hole_cards[:, :, HOLE_PAIRS][:, :, :, None, :]
+
+    # Score all 60 combinations on their ranks, with the suits left out.
+    no_suits = np.zeros((1, 1, 1, 1), dtype=np.int64)
+    combined = add_cards_batch(triple_masks + (no_suits,), pairs)
+    strengths = score_batch(combined[:4] + (np.zeros_like(combined[4]),)).max(axis=(2, 3))
+
+    # Only suited hole pairs on single-suited board triples can make a flush.
+    triple_suits = triples & 3
+    triple_suited = (triple_suits == triple_suits[..., :1]).all(axis=-1)
+    pair_suits = pairs[..., 0, :] & 3
+    pair_suited = pair_suits[..., 0] == pair_suits[..., 1]
+
+    candidates = (pair_suited[..., None] & triple_suited[:, None, None, :]
+                  & (pair_suits[..., 0][..., None] == triple_suits[:, None, None, :, 0]))
+    deal, player, pair, triple = np.nonzero(candidates)
+
+    if len(deal):
+        flush_mask = rank_mask[deal, triple] | (1 << (pairs[deal, player, pair, 0] >> 2)).sum(axis=-1)
+        straight_flush_top = STRAIGHT_TOP_ARRAY[flush_mask]
+        flush_strengths = np.where(straight_flush_top >= 0,
+                                   (9 << CATEGORY_SHIFT) | (straight_flush_top << 16),
+                                   (6 << CATEGORY_SHIFT) | TOP_RANKS_ARRAY[flush_mask])
+        np.maximum.at(strengths, (deal, player), flush_strengths)
+
+    return strengths
+
+
+def deal_omaha(players_hand, num_other_players, num_deals, board, rng):
+    """ Deal the other players' hole cards and the rest of the board for a batch of games. """
+
+    known = [card_id(card) for card in list(players_hand) + list(board)]
+    deck = np.array([c for c in range(52) if c not in known])
+    num_needed = 4 * num_other_players + 5 - len(board)
+
+    # A random ordering of the remaining deck for every deal.
+    order = np.argpartition(rng.random((num_deals, len(deck))), num_needed - 1, axis=1)[:, :num_needed]
+    dealt = deck[order]
+
+    other_hands = dealt[:, :4 * num_other_players].reshape(num_deals, num_other_players, 4)
+    known_board = np.broadcast_to(np.array([card_id(card) for card in board], dtype=dealt.dtype),
+                                  (num_deals, len(board)))
+    boards = np.concatenate([known_board, dealt[:, 4 * num_other_players:]], axis=1)
+
+    hero = np.broadcast_to(np.array([card_id(card) for card in players_hand]), (num_deals, 1, 4))
+    return np.concatenate([hero, other_hands], axis=1), boards
+
+
+def play_omaha_game(players_hand, num_of_other_players, game_sims, board=None, seed=None):
+    """ Play games of Omaha and get the win percentage of a four card hand.
+
+    Like Poker_monte_carlo.play_game, ties count as wins.
+    """
+
+    rng = np.random.default_rng(seed)
+    board = list(board) if board else []
+    batch_deals = tuning_profile.get_setting('omaha_batch_deals', BATCH_DEALS)
+    wins = 0
+
+    for start in range(0, game_sims, batch_deals):
+        num_deals = min(batch_deals, game_sims - start)
+        hole_cards, boards = deal_omaha(players_hand, num_of_other_players, num_deals, board, rng)
+
+        strengths = omaha_strengths(hole_cards, boards)
+        wins += int((strengths[:, 0] >= strengths[:, 1:].max(axis=1)).sum())
+
+    return (wins / game_sims) * 100
@@ -0,0 +1,126 @@
+# outs_calculator.py
+#
+# This file works out exactly how a hand can improve from the flop or the
+# turn. Instead of sampling games, every remaining turn and river card is
+# enumerated (46 turn cards, or 1,081 turn and river pairs from the flop)
+# and scored in a single batch, giving:
+#
+#   - the probability of finishing each street with each hand type, using
+#     the same categories as Poker_monte_carlo.check_hand, and
+#   - the outs: the next cards that change who is ahead against a known
+#     opponent hand, or that improve the hand type when there is none.
+#
+# Cards are the (value, suit) tuples used by Poker_monte_carlo.
+
+
+import functools
+import itertools
+
+import numpy as np
+
+from card_isomorphism import card_id, id_card
+from hand_evaluator import (CATEGORY_SHIFT, HAND_TYPE_NAMES, add_cards_batch, board_masks_batch,
+                            evaluate_with_board_batch, score_batch)
+
+
+@functools.lru_cache(maxsize=None)
+def runout_indices(num_unseen, num_cards):
+    """ Get every choice of num_cards positions out of num_unseen, as an array. """
+
+    # Choosing no cards at all still gives one (empty) runout.
+    choices = list(itertools.combinations(range(num_unseen), num_cards))
+    return np.array(choices, dtype=np.int64).reshape(len(choices), num_cards)
+
+
+def enumerate_runouts(dead_cards, num_cards):
+    """ Get every choice of num_cards cards that aren't dead, as card numbers. """
+
+    known = {card_id(card) for card in dead_cards}
+    unseen = np.array([c for c in range(52) if c not in known])
+
+    return unseen[runout_indices(len(unseen), num_cards)]
+
+
+def runout_strengths(hands, board, runouts):
+    """ Score each hand on the board completed by every runout; returns shape (runouts, hands).
+
+    The board is counted once and only the runout cards are added to it.
+    """
+
+    board_masks = board_masks_batch(np.array([[card_id(card) for card in board]], dtype=np.int64))
+    runout_masks = tuple(mask[:, None] for mask in add_cards_batch(board_masks, runouts))
+    hole_ids = np.array([[card_id(card) for card in hand] for hand in hands])
+
+    return evaluate_with_board_batch(runout_masks, hole_ids[None, :, :])
+
+
+def category_probabilities(players_hand, board, opponent_hand=None):
+    """ Get the exact probability of holding each hand type after each street still to come.
+
+    Returns a dict keyed by the number of board cards (4 for the turn, 5
+    for the river) of dicts mapping hand type names to probabilities. A
+    known opponent hand is taken out of the deck. On the river the only
+    entry is the hand type already made.
+    """
+
+    dead_cards = list(players_hand) + list(board) + list(opponent_hand or [])
+    probabilities = {}
+
+    # A complete board has no streets to come, only the river as it is.
+    first_num_cards = 0 if len(board) == 5 else 1
+    for num_cards in range(first_num_cards, 6 - len(board)):
+        runouts = enumerate_runouts(dead_cards, num_cards)
+        categories = runout_strengths([players_hand], board, runouts)[:, 0] >> CATEGORY_SHIFT
+        counts = np.bincount(categories, minlength=10)
+
+        probabilities[len(board) + num_cards] = {HAND_TYPE_NAMES[category]: float(counts[category] / len(runouts))
+                                                 for category in range(9, 0, -1)}
+
+    return probabilities
+
+
+def win_probability(players_hand, board, opponent_hand):
+    """ Get the exact probabilities of winning and tying against a known hand by the river.
+
+    On a complete board these are just the showdown's result (1.0 or 0.0).
+    """
+
+    runouts = enumerate_runouts(list(players_hand) + list(board) + list(opponent_hand), 5 - len(board))
+    strengths = runout_strengths([players_hand, opponent_hand], board, runouts)
+
+    return (float((strengths[:, 0] > strengths[:, 1]).mean()),
+            float((strengths[:, 0] == strengths[:, 1]).mean()))
+
+
+def find_outs(players_hand, board, opponent_hand=None):
+    """ Get the next cards that change the outcome of the hand.
+
+    Against a known opponent hand these are the cards that change who is
+    ahead (or turn a tie into a win or loss). Without one, they are the
+    cards that improve the hand type with the hole cards playing a part,
+    so cards that only pair the board for everyone don't count.
+    """
+
+    # Once the river is dealt there are no more cards to come.
+    if len(board) not in (3, 4):
+        raise ValueError('Outs can only be found on the flop or the turn.')
+
+    dead_cards = list(players_hand) + list(board) + list(opponent_hand or [])
+    next_cards = enumerate_runouts(dead_cards, 1)
+
+    # Score the board as it is and with every next card added to it.
+    hands = [players_hand] if opponent_hand is None else [players_hand, opponent_hand]
+    strengths = runout_strengths(hands, board, next_cards)
+    current = runout_strengths(hands, board, np.empty((1, 0), dtype=np.int64))[0]
+
+    if opponent_hand is None:
+        board_masks = board_masks_batch(np.array([[card_id(card) for card in board]], dtype=np.int64))
+        board_categories = score_batch(add_cards_batch(board_masks, next_cards)) >> CATEGORY_SHIFT
+        categories = strengths[:, 0] >> CATEGORY_SHIFT
+
+        # The improved hand must also beat what the board alone makes with the card.
+        improved = (categories > current[0] >> CATEGORY_SHIFT) & (categories > board_categories)
+        return [id_card(card) for card in next_cards[improved, 0]]
+
+    changed = np.sign(strengths[:, 0] - strengths[:, 1]) != np.sign(current[0] - current[1])
+    return [id_card(card) for card in next_cards[changed, 0]]
@@ -1,8 +1,26 @@
-import pandas as pd
 import numpy as np
-import matplotlib.pyplot as plt
 import itertools
+import math
+import time
 from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import card_isomorphism
+import flop_equity_table
+import folding_model
+import poker_hand_lookup
+import tuning_profile
+from hand_evaluator import HAND_TYPE_NAMES, Board_state, hand_category
+
+
+# Games simulated for each cell of the pocket hand table.
+POCKET_HAND_SIMULATIONS = 1000
+
+# Share of the time left before a deadline that the next batch of games may use.
+BUDGET_SAFETY_FRACTION = 0.5
+
+# Hand types that generate_hand and hand_type_equity know about.
+HAND_TYPES = ['suited', 'pairs', 'conected', 'conected_suited']
 
 
 class Poker_monte_carlo():
@@ -16,6 +34,10 @@ class Poker_monte_carlo():
         self.deck = list(itertools.product(range(2, 15), ['Spade', 'Heart', 'Diamond', 'Club']))
         self.second_deck = list(itertools.product(range(2, 15), ['Spade', 'Heart', 'Diamond', 'Club']))
 
+        # Pocket hands of each hand type, and simulated win percentages by hand class.
+        self.hand_type_index = None
+        self.pocket_hand_cache = {}
+
     def check_straight_flush(self, hand):
         """ Check for a straight flush. """
 
@@ -537,40 +559,19 @@ class Poker_monte_carlo():
         a series of hands and the cards on the board.
         """
 
-        # Find the best hand out of all the other players hands
-        # Start by comparing the first hand of all of them to all the others.
-        best_other_player_hand = board + other_players_hands[0]
-
-        for hand in other_players_hands:
-            hand = hand + board
-
-            if self.check_hand(hand) > self.check_hand(best_other_player_hand):
-                best_other_player_hand = hand
-            
-            # Find the better hand if they are both the same.
-            elif self.check_hand(hand) == self.check_hand(best_other_player_hand):
-                tie_breaker = self.break_tie(hand, best_other_player_hand)
+        # Count the board once and apply each player's hole cards to it.
+        board_state = Board_state(board)
 
-                if tie_breaker == 1:
-                    best_other_player_hand = hand
+        # Find the best hand out of all the other players hands.
+        best_other_player_strength = max((board_state.strength(hand) for hand in other_players_hands), default=0)
 
         # Compare player's hand with the best hand from the other players.
-        players_hand = players_hand + board
+        players_strength = board_state.strength(players_hand)
 
-        if self.check_hand(players_hand) > self.check_hand(best_other_player_hand):
+        if players_strength > best_other_player_strength:
             return 'Win'
-        
-        # Find the better hand if they are both the same.
-        elif self.check_hand(players_hand) == self.check_hand(best_other_player_hand):
-            final_tie_breaker = self.break_tie(players_hand, best_other_player_hand)
-
-            if final_tie_breaker == 2:
-                return 'Loss'
-            elif final_tie_breaker == 1:
-                return 'Win'
-            else:
-                return 'Tie'
-            return tie
+        elif players_strength == best_other_player_strength:
+            return 'Tie'
         else:
             return 'Loss'
         
@@ -581,27 +582,26 @@ class Poker_monte_carlo():
         Determine what was the winning card combination, given
         a series of hands and the cards on the board. """
 
-        # Find the winnning players hand.
-        best_player_hand = board + players_hands[0]
-
-        for hand in players_hands:
-            hand = hand + board
-            
-            if self.check_hand(hand) > self.check_hand(best_player_hand):
-                best_player_hand = hand
-
-            # Find the better hand if they are both the same.
-            elif self.check_hand(hand) == self.check_hand(best_player_hand):
-                tie_breaker = self.break_tie(hand, best_player_hand)
+        # Count the board once and apply each player's hole cards to it.
+        board_state = Board_state(board)
 
-                if tie_breaker == 1:
-                    best_player_hand = hand
+        # Find the winnning players hand.
+        best_player_strength = max(board_state.strength(hand) for hand in players_hands)
             
         # Get the winning hand.
-        return self.hand_type(best_player_hand)
+        return HAND_TYPE_NAMES[hand_category(best_player_strength)]
     
-    def holdem_simulation(self, players_hand, num_other_players, num_of_folding_players=0):
-        """ Simulate a game of Texas Hold'em. """
+    def holdem_simulation(self, players_hand, num_other_players, num_of_folding_players=0, board=None,
+                          fold_threshold=None):
+        """ Simulate a game of Texas Hold'em. 
+        
+        Community cards that are already known can be passed in as the board;
+        only the rest of the board is dealt. num_of_folding_players opponents
+        picked at random fold, and with a fold_threshold (a folding_model
+        preflop strength) so does every opponent whose hole cards are weaker.
+        """
+
+        known_board = list(board) if board else []
 
         # Copy deck for playing.
         playing_deck = self.deck.copy()
@@ -609,9 +609,10 @@ class Poker_monte_carlo():
         # Shuffle our deck.
         np.random.shuffle(playing_deck)
 
-        # Remove player's hand from playing deck.
+        # Remove player's hand and the known board from playing deck.
         playing_deck = list(filter(lambda x: x != players_hand[0], playing_deck))
         playing_deck = list(filter(lambda x: x != players_hand[1], playing_deck))
+        playing_deck = list(filter(lambda x: x not in known_board, playing_deck))
 
         # Create the other players in the game.
         other_players_hands = []
@@ -623,19 +624,28 @@ class Poker_monte_carlo():
         #--------------------------------
 
         # Draw four cards from the deck and burn the top card.
-        flop = playing_deck[0:4]
-        del playing_deck[0:4]
-        del flop[0]
+        if len(known_board) >= 3:
+            flop = known_board[0:3]
+        else:
+            flop = playing_deck[0:4]
+            del playing_deck[0:4]
+            del flop[0]
 
         # Turn and burn the first two cards in the deck.
-        turn = playing_deck[0:2]
-        del playing_deck[0:2]
-        del turn[0]
+        if len(known_board) >= 4:
+            turn = known_board[3:4]
+        else:
+            turn = playing_deck[0:2]
+            del playing_deck[0:2]
+            del turn[0]
 
         # Draw two cards burn one and flip the final river card.
-        river = playing_deck[0:2]
-        del playing_deck[0:2]
-        del river[0]
+        if len(known_board) >= 5:
+            river = known_board[4:5]
+        else:
+            river = playing_deck[0:2]
+            del playing_deck[0:2]
+            del river[0]
 
         # The board is the sum of the flop (3 cards), the turn (1 card), and the river (1 card).
         board = flop + turn + river
@@ -643,16 +653,17 @@ class Poker_monte_carlo():
         # Handle folding of other players if set. 
         if num_of_folding_players > 0 and num_of_folding_players < num_other_players:
 
-            # Incorporate the randomness of folding.
-            folding_players = np.random.randint(1, num_other_players, num_of_folding_players)
-            hands_to_delete = []
+            # Incorporate the randomness of folding by picking distinct players to fold.
+            folding_players = set(np.random.choice(num_other_players, num_of_folding_players, replace=False).tolist())
 
-            for num in folding_players:
-                hands_to_delete.append(other_players_hands)
-            
-            # Filter out the hand of the folding player from the other players.
-            for hand in hands_to_delete:
-                other_players_hands = list(filter(lambda x: x != hand, other_players_hands))
+            # Filter out the hands of the folding players from the other players.
+            other_players_hands = [hand for i, hand in enumerate(other_players_hands) if i not in folding_players]
+
+        # Opponents with weak hole cards fold too when a strength threshold is set.
+        if fold_threshold is not None and other_players_hands:
+            hole_card_ids = [[card_isomorphism.card_id(card) for card in hand] for hand in other_players_hands]
+            continuing = folding_model.continuing(hole_card_ids, fold_threshold)
+            other_players_hands = [hand for hand, continues in zip(other_players_hands, continuing) if continues]
 
         # Find the winning hand.
         return self.game_result(players_hand, other_players_hands, board)
@@ -698,26 +709,113 @@ class Poker_monte_carlo():
         return self.winning_result(players_hands, board)
     
 
-    def play_game(self, players_hand, num_of_other_players, game_sims, num_of_folding_players):
-        """ Play a game of Texas Hold'em. 
-        
-        Calculate the win percentages of certain hands. 
-        """
+    def count_wins(self, players_hand, num_of_other_players, game_sims, num_of_folding_players=0, board=None,
+                   fold_threshold=None):
+        """ Count the games won (or tied) by a hand over a number of simulations. """
 
         wins = 0
 
         # Play games through numerous simulations.
         for i in range(game_sims):
-            result = self.holdem_simulation(players_hand, num_of_other_players, num_of_folding_players)
+            result = self.holdem_simulation(players_hand, num_of_other_players, num_of_folding_players, board,
+                                            fold_threshold)
 
             # Count wins and ties as wins since you split the pot and always end
             # up with more chips in a tie scenario.
             if result == 'Win' or result == 'Tie':
                 wins += 1
 
+        return wins
+
+
+    def play_game(self, players_hand, num_of_other_players, game_sims, num_of_folding_players, board=None,
+                  fold_threshold=None):
+        """ Play a game of Texas Hold'em. 
+        
+        Calculate the win percentages of certain hands. With a fold_threshold,
+        opponents fold preflop by hand strength as in holdem_batch_simulation.
+        """
+
+        wins = self.count_wins(players_hand, num_of_other_players, game_sims, num_of_folding_players, board,
+                               fold_threshold)
+
         win_percentage = (wins / game_sims) * 100
         return win_percentage
 
+
+    def table_equity(self, players_hand, num_of_other_players, board=None):
+        """ Look up a precomputed win percentage, or return None if there isn't one. 
+        
+        Preflop spots come from the pocket hand table and flop spots from the
+        flop equity table, when it has been built.
+        """
+
+        if not board:
+            hand_data = poker_hand_lookup.get_hand_data(*[poker_hand_lookup.rank_map[value] + poker_hand_lookup.suit_map[suit]
+                                                          for value, suit in players_hand])
+            if not isinstance(hand_data, dict) or f'win_pct{num_of_other_players}' not in hand_data:
+                return None
+            return float(hand_data[f'win_pct{num_of_other_players}']), POCKET_HAND_SIMULATIONS
+
+        if len(board) == 3:
+            table = flop_equity_table.load_table()
+            if table is None:
+                return None
+
+            win_percentage = table.lookup(players_hand, board, num_of_other_players)
+            if win_percentage is None:
+                return None
+            return win_percentage, table.game_simulations
+
+        return None
+
+
+    def equity_within_budget(self, players_hand, num_of_other_players, time_budget_ms=5, board=None,
+                             num_of_folding_players=0):
+        """ Estimate a hand's win percentage within a time budget. 
+        
+        A precomputed table entry is returned straight away. Otherwise games
+        are simulated in batches until the deadline, sizing each batch to
+        take only part of the time left, judging by the time the previous
+        ones took. At least one game is always played.
+        """
+
+        deadline = time.perf_counter() + time_budget_ms / 1000
+
+        # Tables only cover games where nobody is forced to fold.
+        if num_of_folding_players == 0:
+            table_entry = self.table_equity(players_hand, num_of_other_players, board)
+
+            if table_entry is not None:
+                win_percentage, game_sims = table_entry
+                wins = round(win_percentage * game_sims / 100)
+                ci_low, ci_high = win_confidence_interval(wins, game_sims)
+                return {'win_pct': win_percentage, 'wins': wins, 'simulations': game_sims,
+                        'ci_low': ci_low, 'ci_high': ci_high, 'source': 'table'}
+
+        wins = 0
+        game_sims = 0
+        batch_size = 1
+        start = time.perf_counter()
+
+        # Keep simulating while another batch is predicted to finish before the
+        # deadline. Batches only use part of the time left, since game times vary.
+        while True:
+            wins += self.count_wins(players_hand, num_of_other_players, batch_size, num_of_folding_players, board)
+            game_sims += batch_size
+
+            now = time.perf_counter()
+            time_per_game = (now - start) / game_sims
+            batch_size = min(game_sims, int(BUDGET_SAFETY_FRACTION * (deadline - now) / time_per_game))
+
+            if batch_size < 1:
+                break
+
+        ci_low, ci_high = win_confidence_interval(wins, game_sims)
+        return {'win_pct': (wins / game_sims) * 100, 'wins': wins, 'simulations': game_sims,
+                'ci_low': ci_low, 'ci_high': ci_high, 'source': 'simulation'}
+
+
     def is_pocket_pair(self, cards):
         """ Detect a pocket pair. """
 
@@ -784,130 +882,240 @@ class Poker_monte_carlo():
         return potential_cards
     
 
+    def hand_type_members(self, hand_type):
+        """ Get every pocket hand of a hand type. 
+
+        The members of each hand type are indexed once, the first time any
+        hand type is asked for. Unknown hand types have no members.
+        """
+
+        if self.hand_type_index is None:
+            pocket_deck = list(itertools.product(range(2, 15), ['Spade', 'Heart', 'Diamond', 'Club']))
+            hand_combinations = [list(row) for row in itertools.combinations(pocket_deck, 2)]
+
+            self.hand_type_index = {
+                'suited': [hand for hand in hand_combinations if self.is_suited(hand)],
+                'pairs': [hand for hand in hand_combinations if self.is_pocket_pair(hand)],
+                'conected': [hand for hand in hand_combinations if self.is_connected(hand)],
+                'conected_suited': [hand for hand in hand_combinations
+                                    if self.is_connected(hand) and self.is_suited(hand)],
+            }
+
+        return self.hand_type_index.get(hand_type, [])
+    
+
     def generate_hand(self, hand_type):
         """ Generate a certain hand type. """
 
-        # Shuffle a deck of cards.
-        deck = list(itertools.product(range(2,15), ['Spade', 'Heart', 'Diamond', 'Club']))
-        playing_deck = deck.copy()
-        np.random.shuffle(playing_deck)
+        # Pick a random hand from the hand type's members.
+        members = self.hand_type_members(hand_type)
 
-        # Make a random hand based on a selected hand type from the 
-        # shuffled playing deck of cards.
-        players_hand = []
+        if not members:
+            return 'Unknown hand type!'
+        
+        return list(members[np.random.randint(len(members))])
+    
 
-        if hand_type == 'suited':
-            suits = ['Spade', 'Heart', 'Diamond', 'Club']
-            np.random.shuffle(suits)
-            suit = suits[0]
+    def pocket_hand_equity(self, hand, num_of_other_players, game_sims=POCKET_HAND_SIMULATIONS):
+        """ Get the win percentage of a pocket hand, reusing earlier results. 
 
-            players_hand = self.get_suited_cards(suit, playing_deck)[:2]
-        
-        elif hand_type == 'pairs':
-            values = list(range(2, 15))
-            np.random.shuffle(values)
-            value = values[0]
-            
-            players_hand = self.get_pair_cards(value, playing_deck)[:2]
+        The pocket hand table is used when it has the hand. Otherwise the
+        hand's starting hand class is simulated once and cached, since hands
+        that only differ by suits have the same win percentage.
+        """
 
-        elif hand_type == 'conected':
-            values = list(range(2, 15))
-            np.random.shuffle(values)
-            value = values[0]
+        table_entry = self.table_equity(hand, num_of_other_players)
+        if table_entry is not None:
+            return table_entry[0]
 
-            players_hand = self.get_connected_cards(value, playing_deck)[:2]
+        key = (card_isomorphism.hand_class_index(hand), num_of_other_players, game_sims)
+        if key not in self.pocket_hand_cache:
+            self.pocket_hand_cache[key] = self.play_game(hand, num_of_other_players, game_sims, 0)
 
-        elif hand_type == 'conected_suited':
-            suits = ['Spade', 'Heart', 'Diamond', 'Club']
-            np.random.shuffle(suits)
-            suit = suits[0]
+        return self.pocket_hand_cache[key]
 
-            values = list(range(2, 15))
-            np.random.shuffle(values)
-            value = values[0]
 
-            connected_cards = self.get_connected_cards(value, playing_deck)
-            first_card = connected_cards[0]
+    def hand_type_equity(self, hand_types=HAND_TYPES, opponents=range(1, 9), game_sims=POCKET_HAND_SIMULATIONS):
+        """ Get the win percentage of whole hand types for each number of other players. 
 
-            # Only get cards that aren't our card for the potential second card.
-            potential_second_cards = list(filter(lambda x: x != first_card[0], connected_cards))
-            second_cards = potential_second_cards[0]
+        Each hand type's win percentage is the average over all of its
+        pocket hands, since every combination is equally likely to be dealt.
+        Returns a dict keyed by (hand type, number of other players).
+        Raises ValueError for hand types not in HAND_TYPES.
+        """
 
-            players_hand = [first_card, second_cards]
+        unknown = [hand_type for hand_type in hand_types if hand_type not in HAND_TYPES]
+        if unknown:
+            raise ValueError(f'Unknown hand types {unknown}; expected some of {HAND_TYPES}.')
 
-        else:
-            return 'Unknown hand type!'
-        
-        return players_hand
-    
-    def pocket_hand_analysis(self):
-        """ Collect data for pocket hand winning percentages. 
+        results = {}
+        for hand_type in hand_types:
+            members = self.hand_type_members(hand_type)
 
-        Go through every possible pocket cards combo and record the winning %
-        for games with varrying amounts of other players.
-        """
+            for num_of_other_players in opponents:
+                total = sum(self.pocket_hand_equity(hand, num_of_other_players, game_sims) for hand in members)
+                results[(hand_type, num_of_other_players)] = total / len(members)
+
+        return results
 
 
-        # Set up the simulation with the deck, hand combos, and the amount of games
-        # simulated.
+    def pocket_hand_cells(self):
+        """ List every (pocket cards, number of other players) cell of the analysis. """
+
+        # Set up every possible hand combination.
         pocket_deck = list(itertools.product(range(2, 15), ['Spade', 'Heart', 'Diamond', 'Club']))
         hand_combinations = list(itertools.combinations(pocket_deck, 2))
         hand_combinations = [list(row) for row in hand_combinations]
-        num_of_folding_players = 0
-        game_simulations = 1000
 
         # Choose random hands when simulating.
         np.random.shuffle(hand_combinations)
 
-        columns = ['Pocket Cards', 'Pair', 'Suited', 'Connected', 'Win Pct1', 'Win Pct2', 'Win Pct3', 'Win Pct4', 'Win Pct5', 'Win Pct6', 'Win Pct7', 'Win Pct8']
-        hands_df = pd.DataFrame(columns=columns)
+        return [(hand, i) for hand in hand_combinations for i in range(1, 9)]
 
 
-        # Simulate desired amount of poker games.
-        for hand in hand_combinations:
-                pocket_cards = str(hand)
-                each_hands_data_dict = {'Pocket Cards': pocket_cards, 
-                                        'Pair': self.is_pocket_pair(hand), 
-                                        'Suited': self.is_suited(hand), 
-                                        'Connected': self.is_connected(hand),
-                                        }
-                for i in range(1, 9):
-                    each_hands_data_dict['Win Pct' + str(i)] = self.play_game(hand, i, game_simulations, num_of_folding_players)
-
-                new_row_df = pd.DataFrame(each_hands_data_dict, index=[0])
-                hands_df = pd.concat([hands_df, new_row_df], ignore_index=True)
-                    
+    def cell_result(self, hand, num_of_other_players, wins, game_sims):
+        """ Package the outcome of one pocket hand analysis cell. """
 
+        ci_low, ci_high = win_confidence_interval(wins, game_sims)
 
-        # Store data frame of simulated games in a csv.
-        print(hands_df)
-        hands_df.to_csv('data/pocket_hand_wins.csv')
+        return {'pocket_cards': hand,
+                'pair': self.is_pocket_pair(hand),
+                'suited': self.is_suited(hand),
+                'connected': self.is_connected(hand),
+                'opponents': num_of_other_players,
+                'wins': wins,
+                'simulations': game_sims,
+                'win_pct': (wins / game_sims) * 100,
+                'ci_low': ci_low,
+                'ci_high': ci_high}
 
 
+    def pocket_hand_results(self, game_simulations=1000, num_of_folding_players=0, max_workers=None):
+        """ Yield the result of each pocket hand analysis cell as soon as it completes.
 
-            
+        With max_workers left as None the cells are simulated in this process,
+        in order. Otherwise they are spread over a pool of worker processes and
+        yielded in completion order.
+        """
 
+        cells = self.pocket_hand_cells()
 
+        # Simulate in this process with the instance's random state.
+        if max_workers is None:
+            for hand, num_of_other_players in cells:
+                wins = self.count_wins(hand, num_of_other_players, game_simulations, num_of_folding_players)
+                yield self.cell_result(hand, num_of_other_players, wins, game_simulations)
+            return
 
-        
-    
+        # Give every cell its own seed so results don't depend on scheduling.
+        executor = ProcessPoolExecutor(max_workers=max_workers)
+        try:
+            futures = [executor.submit(simulate_cell, hand, num_of_other_players, game_simulations,
+                                       num_of_folding_players, seed)
+                       for seed, (hand, num_of_other_players) in enumerate(cells)]
 
-        
-        
+            for future in as_completed(futures):
+                yield future.result()
+        finally:
+            # A consumer that stops early shouldn't wait for the cells it no longer wants.
+            executor.shutdown(wait=False, cancel_futures=True)
+
+
+    async def pocket_hand_results_async(self, game_simulations=1000, num_of_folding_players=0, max_workers=None):
+        """ Asynchronously yield pocket hand analysis cells in completion order.
+
+        The simulations run in a pool of worker processes so the event loop
+        is never blocked. The number of workers defaults to the tuned setting.
+        """
+
+        # Only this method needs asyncio, so keep it out of the engine's import.
+        import asyncio
+
+        if max_workers is None:
+            max_workers = tuning_profile.get_setting('max_workers')
+
+        cells = self.pocket_hand_cells()
+        loop = asyncio.get_running_loop()
+
+        executor = ProcessPoolExecutor(max_workers=max_workers)
+        futures = []
+        try:
+            futures = [loop.run_in_executor(executor, simulate_cell, hand, num_of_other_players,
+                                            game_simulations, num_of_folding_players, seed)
+                       for seed, (hand, num_of_other_players) in enumerate(cells)]
+
+            for future in asyncio.as_completed(futures):
+                yield await future
+        finally:
+            # Stopping early cancels the remaining cells without blocking the event loop.
+            for future in futures:
+                future.cancel()
+            executor.shutdown(wait=False, cancel_futures=True)
 
     
+    def pocket_hand_analysis(self, max_workers=None):
+        """ Collect data for pocket hand winning percentages. 
 
+        Go through every possible pocket cards combo and record the winning %
+        for games with varrying amounts of other players.
+        """
 
+        # Only the analysis needs pandas, so keep it out of the engine's import.
+        import pandas as pd
 
+        num_of_folding_players = 0
+        game_simulations = POCKET_HAND_SIMULATIONS
 
+        columns = ['Pocket Cards', 'Pair', 'Suited', 'Connected', 'Win Pct1', 'Win Pct2', 'Win Pct3', 'Win Pct4', 'Win Pct5', 'Win Pct6', 'Win Pct7', 'Win Pct8']
+        hands_df = pd.DataFrame(columns=columns)
 
+        # Collect the cells of each hand until all player counts are in.
+        pending_hands = {}
 
-        
+        # Simulate desired amount of poker games.
+        for result in self.pocket_hand_results(game_simulations, num_of_folding_players, max_workers):
+                pocket_cards = str(result['pocket_cards'])
+                each_hands_data_dict = pending_hands.setdefault(pocket_cards, {
+                                        'Pocket Cards': pocket_cards, 
+                                        'Pair': result['pair'], 
+                                        'Suited': result['suited'], 
+                                        'Connected': result['connected'],
+                                        })
+                each_hands_data_dict['Win Pct' + str(result['opponents'])] = result['win_pct']
+
+                if len(each_hands_data_dict) == len(columns):
+                    del pending_hands[pocket_cards]
+                    new_row_df = pd.DataFrame(each_hands_data_dict, index=[0])
+                    hands_df = pd.concat([hands_df, new_row_df], ignore_index=True)
+                    
+
+
+        # Store data frame of simulated games in a csv.
+        print(hands_df)
+        hands_df.to_csv('data/pocket_hand_wins.csv')
+
+
+def win_confidence_interval(wins, game_sims, z=1.96):
+    """ Wilson score interval for a win percentage, in percent. """
+
+    if game_sims == 0:
+        return 0.0, 100.0
+
+    p = wins / game_sims
+    denominator = 1 + z ** 2 / game_sims
+    centre = (p + z ** 2 / (2 * game_sims)) / denominator
+    margin = z * math.sqrt(p * (1 - p) / game_sims + z ** 2 / (4 * game_sims ** 2)) / denominator
 
+    return max(0.0, centre - margin) * 100, min(1.0, centre + margin) * 100
 
 
+def simulate_cell(hand, num_of_other_players, game_sims, num_of_folding_players=0, seed=None):
+    """ Simulate one pocket hand analysis cell in a worker process. """
 
-                
+    simulation = Poker_monte_carlo()
 
+    if seed is not None:
+        np.random.seed(seed)
 
-    
\ No newline at end of file
+    wins = simulation.count_wins(hand, num_of_other_players, game_sims, num_of_folding_players)
+    return simulation.cell_result(hand, num_of_other_players, wins, game_sims)
@@ -0,0 +1,279 @@
+# shared_tables.py
+#
+# This file publishes lookup tables to shared memory once per host so that
+# many bot worker processes can read them without each loading its own copy.
+# A publisher copies a set of named NumPy arrays into one shared memory
+# segment and describes it in a small control segment with a fixed name.
+# Workers attach to the tables by that name and get zero-copy array views.
+#
+# Publishing a new set of tables creates a new data segment and then bumps
+# the version in the control segment, so tables can be hot-swapped: workers
+# notice the new version on their next access and move over to it, and the
+# old segment is unlinked (memory stays valid for workers still using it
+# until they let go of it).
+
+
+import json
+import math
+import struct
+import sys
+import threading
+from multiprocessing import resource_tracker, shared_memory
+
+import numpy as np
+
+import flop_equity_table
+import poker_hand_lookup
+
+
+CONTROL_SIZE = 64 * 1024
+ALIGNMENT = 64
+
+# The control segment starts with the version and the manifest's length.
+CONTROL_HEADER = struct.Struct('<QI')
+
+# Held while resource_tracker.register is swapped out, and while this module
+# creates segments, so no registration made here is lost.
+TRACKER_LOCK = threading.Lock()
+
+
+class Attached_segment(shared_memory.SharedMemory):
+    """ A shared memory segment opened by a reader, which array views may outlive. """
+
+    def __del__(self):
+        """ Close the segment, unless array views still use it (they then keep it mapped). """
+
+        try:
+            self.close()
+        except BufferError:
+            pass
+
+
+def attach_segment(name):
+    """ Attach to an existing shared memory segment without taking ownership of it.
+
+    Before Python 3.13 attached segments were also registered with the
+    resource tracker, which would unlink them when the worker exits, so the
+    registration is skipped for the moment of attaching. Segments created
+    elsewhere in the process at that moment should go through TRACKER_LOCK
+    too, as Shared_table_publisher's do.
+    """
+
+    if sys.version_info >= (3, 13):
+        return Attached_segment(name=name, track=False)
+
+    # Skip the registration rather than undoing it, since forked workers
+    # share the publisher's resource tracker.
+    with TRACKER_LOCK:
+        register = resource_tracker.register
+        resource_tracker.register = lambda name, rtype: None
+        try:
+            return Attached_segment(name=name)
+        finally:
+            resource_tracker.register = register
+
+
+def array_views(buffer, manifest):
+    """ Make read-only zero-copy array views of the arrays described by a manifest. """
+
+    views = {}
+    for key, info in manifest['arrays'].items():
+        # frombuffer holds on to the buffer, so it stays mapped while the view is in use.
+        view = np.frombuffer(buffer, dtype=np.dtype(info['dtype']), count=math.prod(info['shape']),
+                             offset=info['offset']).reshape(info['shape'])
+
+        # The memory is shared with every worker on the host, so none may write to it.
+        view.flags.writeable = False
+        views[key] = view
+    return views
+
+
+class Shared_table_publisher():
+    """ Publish named arrays to shared memory and hot-swap new versions of them. """
+
+    def __init__(self, name):
+        """ Create the control segment that workers attach to by name. """
+
+        self.name = name
+        with TRACKER_LOCK:
+            self.control = shared_memory.SharedMemory(name=name, create=True, size=CONTROL_SIZE)
+        self.segment = None
+        self.version = 0
+        CONTROL_HEADER.pack_into(self.control.buf, 0, self.version, 0)
+
+    def publish(self, arrays):
+        """ Copy a dict of arrays into a new segment and make it the current version. """
+
+        # Lay the arrays out one after the other, aligned for fast access.
+        arrays = {key: np.ascontiguousarray(array) for key, array in arrays.items()}
+        manifest = {'arrays': {}, 'segment': f'{self.name}_v{self.version // 2 + 1}'}
+        size = 0
+        for key, array in arrays.items():
+            if array.dtype.hasobject:
+                raise ValueError(f'Array {key!r} holds Python objects, which cannot be shared.')
+            size = -(-size // ALIGNMENT) * ALIGNMENT
+            manifest['arrays'][key] = {'dtype': array.dtype.str, 'shape': list(array.shape), 'offset': size}
+            size += array.nbytes
+
+        encoded = json.dumps(manifest).encode()
+        if CONTROL_HEADER.size + len(encoded) > CONTROL_SIZE:
+            raise ValueError('Too many arrays to describe in the control segment.')
+
+        # Copy through temporary slices so no view keeps the segment from being closed.
+        with TRACKER_LOCK:
+            segment = shared_memory.SharedMemory(name=manifest['segment'], create=True, size=max(size, 1))
+        try:
+            for key, array in arrays.items():
+                offset = manifest['arrays'][key]['offset']
+                segment.buf[offset:offset + array.nbytes] = array.reshape(-1).view(np.uint8)
+        except BaseException:
+            segment.close()
+            segment.unlink()
+            raise
+
+        # An odd version tells workers the manifest is being rewritten.
+        CONTROL_HEADER.pack_into(self.control.buf, 0, self.version + 1, 0)
+        self.control.buf[CONTROL_HEADER.size:CONTROL_HEADER.size + len(encoded)] = encoded
+        self.version += 2
+        CONTROL_HEADER.pack_into(self.control.buf, 0, self.version, len(encoded))
+
+        # Workers still holding the old segment keep their mapping after it is unlinked.
+        if self.segment is not None:
+            self.segment.close()
+            self.segment.unlink()
+        self.segment = segment
+
+        return self.version // 2
+
+    def close(self):
+        """ Remove the tables from shared memory. """
+
+        for segment in (self.segment, self.control):
+            if segment is not None:
+                segment.close()
+                segment.unlink()
+        self.segment = None
+
+
+class Shared_table_reader():
+    """ Zero-copy access to arrays published by a Shared_table_publisher. """
+
+    def __init__(self, name):
+        """ Attach to the control segment of the published tables. """
+
+        self.control = attach_segment(name)
+        self.segment = None
+        self.version = None
+        self.arrays = {}
+        self.flop_table = None
+
+        # Segments of old versions, kept open until no view of them is left.
+        self.retired = []
+
+    def read_manifest(self):
+        """ Read a consistent (version, manifest) pair from the control segment. """
+
+        while True:
+            version, length = CONTROL_HEADER.unpack_from(self.control.buf, 0)
+            if version % 2 == 0:
+                encoded = bytes(self.control.buf[CONTROL_HEADER.size:CONTROL_HEADER.size + length])
+                if CONTROL_HEADER.unpack_from(self.control.buf, 0)[0] == version:
+                    return version, json.loads(encoded) if length else None
+
+    def refresh(self):
+        """ Move over to the newest published version if it has changed. """
+
+        while True:
+            # Only parse the manifest once the version in the header has changed.
+            if CONTROL_HEADER.unpack_from(self.control.buf, 0)[0] == self.version:
+                return self.arrays
+
+            version, manifest = self.read_manifest()
+            if version == self.version:
+                return self.arrays
+            if manifest is None:
+                raise LookupError('No tables have been published yet.')
+
+            # The segment may have been swapped out again before we attached.
+            try:
+                segment = attach_segment(manifest['segment'])
+            except FileNotFoundError:
+                continue
+
+            # Views of the old version keep its mapping alive for as long as they are used.
+            if self.segment is not None:
+                self.retired.append(self.segment)
+            self.segment = segment
+            self.version = version
+            self.arrays = array_views(segment.buf, manifest)
+            self.flop_table = None
+            self.close_retired()
+            return self.arrays
+
+    def close_retired(self):
+        """ Close the segments of old versions that no array views refer to any more. """
+
+        still_used = []
+        for segment in self.retired:
+            try:
+                segment.close()
+            except BufferError:
+                still_used.append(segment)
+        self.retired = still_used
+
+    def __getitem__(self, key):
+        """ Get a published array by name. """
+
+        return self.refresh()[key]
+
+    def hand_win_percentages(self, card1, card2):
+        """ Get the pocket hand table's win percentages against 1-8 players, like get_hand_data. """
+
+        arrays = self.refresh()
+        key = poker_hand_lookup.normalize_cards(card1, card2).encode()
+        row = int(np.searchsorted(arrays['pocket_keys'], key))
+
+        if row == len(arrays['pocket_keys']) or arrays['pocket_keys'][row] != key:
+            return None
+        return arrays['pocket_win_pct'][row]
+
+    def get_flop_table(self):
+        """ Get a Flop_equity_table over the published flop arrays. """
+
+        arrays = self.refresh()
+        if self.flop_table is None:
+            self.flop_table = flop_equity_table.Flop_equity_table(arrays['flop_keys'], arrays['flop_table'],
+                                                                  int(arrays['flop_game_simulations'][0]))
+        return self.flop_table
+
+
+def pocket_hand_arrays():
+    """ Turn the pocket hand table into arrays sorted by pocket cards. """
+
+    hand_data = poker_hand_lookup.load_hand_data()
+    pocket_cards = sorted(hand_data)
+
+    return {
+        'pocket_keys': np.array([cards.encode() for cards in pocket_cards], dtype='S5'),
+        'pocket_win_pct': np.array([[float(hand_data[cards][f'win_pct{i}']) for i in range(1, 9)]
+                                    for cards in pocket_cards], dtype=np.float32),
+    }
+
+
+def flop_table_arrays(directory=flop_equity_table.DATA_DIR):
+    """ Get the flop equity table's arrays, or an empty dict if it hasn't been built. """
+
+    table = flop_equity_table.load_table(directory)
+    if table is None:
+        return {}
+
+    return {'flop_keys': table.keys, 'flop_table': table.table,
+            'flop_game_simulations': np.array([table.game_simulations])}
+
+
+def publish_lookup_tables(name, directory=flop_equity_table.DATA_DIR):
+    """ Publish the pocket hand table, and the flop table if it is built, under a name. """
+
+    publisher = Shared_table_publisher(name)
+    publisher.publish({**pocket_hand_arrays(), **flop_table_arrays(directory)})
+    return publisher
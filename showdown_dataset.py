@@ -0,0 +1,229 @@
+# showdown_dataset.py
+#
+# This file generates large datasets of simulated showdowns for training
+# models. Every record is one deal with a fixed number of players: each
+# player's hole cards and the board as card numbers (0-51, as in
+# card_isomorphism), each player's strength class and a bit mask of the
+# winners (bit i set when seat i wins or ties).
+#
+# Strength classes rank the 7,462 distinct five card hand values from 1 (the
+# weakest, 7-5-4-3-2) to 7462 (a royal flush), so equal classes tie and a
+# higher class wins. strength_classes() maps a class back to a
+# hand_evaluator strength.
+#
+# Files are append-only: a header (magic, a length and a JSON description
+# of the record dtype, player count and seed, padded to 64 bytes) is
+# followed by fixed size records, which read_showdowns memory-maps. Deals
+# are generated in chunks spread over worker processes that write straight
+# into their part of the file. Each chunk's random numbers are seeded from
+# the file's seed and the chunk's first record, so a file can be rebuilt
+# exactly.
+#
+#     python showdown_dataset.py showdowns.psd --deals 10000000 --players 6
+
+
+import argparse
+import functools
+import itertools
+import json
+import os
+import struct
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+import tuning_profile
+from hand_evaluator import board_masks_batch, evaluate_batch, evaluate_with_board_batch
+
+
+MAGIC = b'PSD1\x00\x00\x00\x00'
+HEADER_LENGTH = struct.Struct('<I')
+HEADER_ALIGNMENT = 64
+MAX_PLAYERS = 9
+
+NUM_STRENGTH_CLASSES = 7462
+
+# Deals generated by each job.
+CHUNK_DEALS = 1 << 20
+
+# Deals scored together in one batch.
+BATCH_DEALS = 1 << 16
+
+
+def record_dtype(num_players):
+    """ Get the record dtype of a file with a number of players. """
+
+    return np.dtype([
+        ('hole', 'u1', (num_players, 2)),
+        ('board', 'u1', (5,)),
+        ('strength_class', '<u2', (num_players,)),
+        ('winners', '<u2'),
+    ])
+
+
+@functools.lru_cache(maxsize=None)
+def strength_classes():
+    """ Get the sorted strengths of every distinct five card hand value.
+
+    Strength class c is the strength at index c - 1. Every rank multiset is
+    scored with mixed suits, plus every set of five distinct ranks as a
+    flush.
+    """
+
+    rank_sets = [ranks for ranks in itertools.combinations_with_replacement(range(13), 5)
+                 if max(ranks.count(rank) for rank in ranks) <= 4]
+    hands = [[rank * 4 + i % 4 for i, rank in enumerate(ranks)] for ranks in rank_sets]
+    hands += [[rank * 4 for rank in ranks] for ranks in itertools.combinations(range(13), 5)]
+
+    return np.unique(evaluate_batch(np.array(hands)))
+
+
+def strength_class(strengths):
+    """ Turn hand_evaluator strengths into strength classes. """
+
+    return (np.searchsorted(strength_classes(), strengths) + 1).astype(np.uint16)
+
+
+def generate_records(num_deals, num_players, rng, batch_deals=BATCH_DEALS):
+    """ Deal and score random showdowns, returning an array of records. """
+
+    records = np.empty(num_deals, dtype=record_dtype(num_players))
+    num_cards = 2 * num_players + 5
+
+    for start in range(0, num_deals, batch_deals):
+        stop = min(start + batch_deals, num_deals)
+
+        # The first cards of a random ordering of the deck.
+        cards = np.argpartition(rng.random((stop - start, 52)), num_cards - 1, axis=1)[:, :num_cards]
+        hole_cards = cards[:, :2 * num_players].reshape(-1, num_players, 2)
+        boards = cards[:, 2 * num_players:]
+
+        board_masks = tuple(mask[:, None] for mask in board_masks_batch(boards))
+        classes = strength_class(evaluate_with_board_batch(board_masks, hole_cards))
+        winners = classes == classes.max(axis=1, keepdims=True)
+
+        batch = records[start:stop]
+        batch['hole'] = hole_cards
+        batch['board'] = boards
+        batch['strength_class'] = classes
+        batch['winners'] = (winners << np.arange(num_players)).sum(axis=1)
+
+    return records
+
+
+def write_header(path, num_players, seed):
+    """ Start a new, empty showdown file. """
+
+    header = {
+        'num_players': num_players,
+        'seed': seed,
+        'dtype': record_dtype(num_players).descr,
+        'num_strength_classes': NUM_STRENGTH_CLASSES,
+    }
+    encoded = json.dumps(header).encode()
+    size = len(MAGIC) + HEADER_LENGTH.size + len(encoded)
+    encoded += b' ' * (-size % HEADER_ALIGNMENT)
+
+    with open(path, 'wb') as file:
+        file.write(MAGIC + HEADER_LENGTH.pack(len(encoded)) + encoded)
+
+
+def read_header(path):
+    """ Read a showdown file's header and return (header, offset of the first record). """
+
+    with open(path, 'rb') as file:
+        if file.read(len(MAGIC)) != MAGIC:
+            raise ValueError(f'{path} is not a showdown file.')
+
+        length, = HEADER_LENGTH.unpack(file.read(HEADER_LENGTH.size))
+        header = json.loads(file.read(length))
+
+    return header, len(MAGIC) + HEADER_LENGTH.size + length
+
+
+def read_showdowns(path):
+    """ Memory-map the records of a showdown file, returning (header, records).
+
+    A record left incomplete by an interrupted append is left out.
+    """
+
+    header, offset = read_header(path)
+    dtype = record_dtype(header['num_players'])
+    num_records = (os.path.getsize(path) - offset) // dtype.itemsize
+
+    return header, np.memmap(path, dtype=dtype, mode='r', offset=offset, shape=(num_records,))
+
+
+def generate_chunk(path, start, stop):
+    """ Generate records [start, stop) of a showdown file in place. """
+
+    header, offset = read_header(path)
+    dtype = record_dtype(header['num_players'])
+    rng = np.random.default_rng(np.random.SeedSequence(header['seed'], spawn_key=(start,)))
+
+    records = np.memmap(path, dtype=dtype, mode='r+', offset=offset + start * dtype.itemsize,
+                        shape=(stop - start,))
+    records[:] = generate_records(stop - start, header['num_players'], rng)
+    records.flush()
+
+    return stop - start
+
+
+def append_showdowns(path, num_deals, chunk_size=CHUNK_DEALS, max_workers=None):
+    """ Append newly generated deals to a showdown file across worker processes.
+
+    Returns the number of records in the file afterwards.
+    """
+
+    if max_workers is None:
+        max_workers = tuning_profile.get_setting('max_workers')
+
+    header, offset = read_header(path)
+    dtype = record_dtype(header['num_players'])
+    first = (os.path.getsize(path) - offset) // dtype.itemsize
+    last = first + num_deals
+
+    # Drop any incomplete record and make room for the new ones.
+    os.truncate(path, offset + last * dtype.itemsize)
+
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        futures = [executor.submit(generate_chunk, path, start, min(start + chunk_size, last))
+                   for start in range(first, last, chunk_size)]
+        for future in futures:
+            future.result()
+
+    return last
+
+
+def generate_showdowns(path, num_deals, num_players, seed=0, chunk_size=CHUNK_DEALS, max_workers=None):
+    """ Write a new showdown file of randomly generated deals. """
+
+    if not 2 <= num_players <= MAX_PLAYERS:
+        raise ValueError(f'Showdowns need 2 to {MAX_PLAYERS} players.')
+
+    write_header(path, num_players, seed)
+    return append_showdowns(path, num_deals, chunk_size, max_workers)
+
+
+def main():
+    """ Generate or extend a showdown file from the command line. """
+
+    parser = argparse.ArgumentParser(description='Generate simulated showdowns for training data.')
+    parser.add_argument('path')
+    parser.add_argument('--deals', type=int, default=1000000)
+    parser.add_argument('--players', type=int, default=6)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--append', action='store_true', help='Add deals to an existing file.')
+    parser.add_argument('--chunk-size', type=int, default=CHUNK_DEALS)
+    parser.add_argument('--workers', type=int, default=None)
+    args = parser.parse_args()
+
+    if args.append:
+        total = append_showdowns(args.path, args.deals, args.chunk_size, args.workers)
+    else:
+        total = generate_showdowns(args.path, args.deals, args.players, args.seed, args.chunk_size, args.workers)
+    print(f"{args.path} holds {total} deals")
+
+
+if __name__ == '__main__':
+    main()
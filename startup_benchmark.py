@@ -0,0 +1,70 @@
+# startup_benchmark.py
+#
+# This file measures how long a fresh Python process takes to import the
+# library modules and answer its first lookup. Bot processes are short-lived
+# and restart often, so cold-start latency is checked against a budget and
+# the script exits with an error when a budget is exceeded.
+
+
+import os
+import subprocess
+import sys
+
+
+# Probes import the library from this directory, wherever the script is run from.
+REPO_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Each probe runs in a fresh interpreter and prints the elapsed milliseconds
+# from before the import until its first result is available.
+PROBES = {
+    'poker_hand_lookup first lookup': (
+        'import time; start = time.perf_counter()\n'
+        'import poker_hand_lookup\n'
+        'poker_hand_lookup.get_hand_data("Kh", "Ts")\n'
+        'print((time.perf_counter() - start) * 1000)\n'
+    ),
+    'poker_monte_carlo import': (
+        'import time; start = time.perf_counter()\n'
+        'import poker_monte_carlo\n'
+        'print((time.perf_counter() - start) * 1000)\n'
+    ),
+}
+
+# Budgets in milliseconds for the median of the runs of each probe.
+BUDGETS_MS = {
+    'poker_hand_lookup first lookup': 50,
+    'poker_monte_carlo import': 250,
+}
+
+
+def time_probe(code, runs=5):
+    """ Run a probe in fresh interpreters and return the median time in ms. """
+
+    timings = []
+    for i in range(runs):
+        output = subprocess.run([sys.executable, '-c', code], capture_output=True, text=True, check=True,
+                                cwd=REPO_DIR)
+        timings.append(float(output.stdout.strip().splitlines()[-1]))
+
+    return sorted(timings)[len(timings) // 2]
+
+
+def main():
+    """ Time every probe and fail if any of them is over budget. """
+
+    over_budget = False
+
+    for name, code in PROBES.items():
+        elapsed = time_probe(code)
+        budget = BUDGETS_MS[name]
+        status = 'ok' if elapsed <= budget else 'OVER BUDGET'
+        print(f"{name}: {elapsed:.1f} ms (budget {budget} ms) {status}")
+
+        if elapsed > budget:
+            over_budget = True
+
+    sys.exit(1 if over_budget else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,51 @@
+# tuning_profile.py
+#
+# This file loads the per-machine tuning profile written by calibrate.py:
+# batch sizes, worker counts and the runout count at which enumerating every
+# runout stops paying off against sampling. The profile is read the first
+# time a setting is asked for, never at import time, and a profile written
+# on a machine with a different number of CPUs is ignored. Without a usable
+# profile every setting falls back to the default given by its caller.
+
+
+import json
+import os
+
+
+PROFILE_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'tuning_profile.json')
+
+# Settings of the loaded profile, read on first use.
+profile = None
+
+
+def load_profile(path=PROFILE_FILE):
+    """ Read the profile once and cache its settings, or cache no settings if there isn't a usable one. """
+
+    global profile
+    if profile is None:
+        try:
+            with open(path, 'r') as file:
+                saved = json.load(file)
+        except (OSError, ValueError):
+            saved = {}
+
+        profile = saved.get('settings', {}) if saved.get('cpu_count') == os.cpu_count() else {}
+    return profile
+
+
+def get_setting(name, default=None):
+    """ Get a tuned setting, or the default if it hasn't been calibrated on this machine. """
+
+    return load_profile().get(name, default)
+
+
+def save_profile(settings, measurements=None, path=PROFILE_FILE):
+    """ Write calibrated settings for this machine and make them the loaded profile. """
+
+    global profile
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'w') as file:
+        json.dump({'cpu_count': os.cpu_count(), 'settings': settings, 'measurements': measurements or {}},
+                  file, indent=2)
+
+    profile = dict(settings)